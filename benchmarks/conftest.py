@@ -0,0 +1,51 @@
+import glob
+import os
+import sys
+import tempfile
+import warnings
+
+import pytest
+
+# The engines read the store of utils.storage, so the synthetic one has to be configured before they are imported
+DATA_DIR = tempfile.mkdtemp(prefix='planning-benchmarks-')
+os.environ['PLANNING_DATABASE'] = os.path.join(DATA_DIR, 'planning.db')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generate_data import generate
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Scale of the stored baselines. Changing it invalidates them
+MEMBERS = 60
+ASSIGNMENTS = 3000
+YEARS = 3
+FIRST_YEAR = 2024
+BOOST_DENSITY = 0.3
+SEED = 0
+
+
+def pytest_configure(config):
+    # Runs before pytest-benchmark loads the baselines. They are read from benchmarks/baselines wherever pytest runs
+    # from, and the regression check of pytest.ini (--benchmark-compare-fail) needs a baseline of this platform: on a
+    # platform without one the run only measures, so a first baseline can be saved
+    if not hasattr(config.option, 'benchmark_storage'):
+        return
+    if config.option.benchmark_storage == 'file://./.benchmarks':  # Not given in the command line
+        config.option.benchmark_storage = BASELINES
+
+    from pytest_benchmark.utils import get_machine_id
+
+    storage = config.option.benchmark_storage.removeprefix('file://')
+    if config.option.benchmark_compare and not glob.glob(os.path.join(storage, get_machine_id(), '*.json')):
+        warnings.warn(f"No baseline of {get_machine_id()} in {storage}: the benchmarks aren't compared")
+        config.option.benchmark_compare = None
+        config.option.benchmark_compare_fail = None
+
+
+@pytest.fixture(scope='session', autouse=True)
+def synthetic_data():
+    return generate(
+        os.environ['PLANNING_DATABASE'], MEMBERS, ASSIGNMENTS, YEARS, FIRST_YEAR, BOOST_DENSITY, SEED
+    )
@@ -0,0 +1,164 @@
+import argparse
+import datetime
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+
+# Local stand-in for the events.list endpoint of the Google Calendar API, to sync calendars offline. It serves pages
+# (pageToken, maxResults), incremental syncs (syncToken, 410 when the token is unknown) and can answer slowly, per
+# calendar. The app syncs from it when PLANNING_CALENDAR_ENDPOINT points to it:
+#     python benchmarks/fake_calendar.py --calendars oficina-a,oficina-b --events 2000 --latency 0.2
+#     PLANNING_CALENDAR_ENDPOINT=http://127.0.0.1:8765/ PLANNING_LEAVE_CALENDARS=oficina-a,oficina-b \
+#         streamlit run src/app.py
+
+# The client sends the path without the service path (calendar/v3) when its endpoint is replaced
+EVENTS_PATH = re.compile(r'^(?:/calendar/v3)?/calendars/(?P<calendar_id>[^/]+)/events$')
+PAGE_SIZE = 250  # Default maxResults of the API
+
+
+class FakeCalendarServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0):
+        super().__init__(address, _EventsHandler)
+        self.latency = latency  # Seconds per page: a number, or a dict calendar id -> seconds
+        self.version = 0  # Bumped by every change, the sync tokens are versions
+        self.events = {}  # Calendar id -> event id -> (version of its last change, event)
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def put_events(self, calendar_id, events):
+        # Add or replace events (in the format of the API)
+        with self.lock:
+            self.version += 1
+            calendar = self.events.setdefault(calendar_id, {})
+            for event in events:
+                calendar[event['id']] = (self.version, event)
+
+    def cancel_events(self, calendar_id, ids):
+        with self.lock:
+            self.version += 1
+            calendar = self.events.setdefault(calendar_id, {})
+            for event_id in ids:
+                calendar[event_id] = (self.version, {'id': event_id, 'status': 'cancelled'})
+
+    def list_events(self, calendar_id, sync_token, page_token, max_results):
+        # One page of events.list, or None when the sync token isn't valid
+        with self.lock:
+            if sync_token is not None and not (sync_token.isdigit() and int(sync_token) <= self.version):
+                return None
+            since = int(sync_token) if sync_token is not None else 0
+            changes = sorted(self.events.get(calendar_id, {}).items())
+            items = [
+                event for _, (version, event) in changes
+                if version > since and (sync_token is not None or event.get('status') != 'cancelled')
+            ]
+            version = self.version
+
+        offset = int(page_token or 0)
+        page = {'kind': 'calendar#events', 'items': items[offset:offset + max_results]}
+        if offset + max_results < len(items):
+            page['nextPageToken'] = str(offset + max_results)
+        else:
+            page['nextSyncToken'] = str(version)
+        return page
+
+    def page_latency(self, calendar_id):
+        if isinstance(self.latency, dict):
+            return self.latency.get(calendar_id, 0.0)
+        return self.latency
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _EventsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        match = EVENTS_PATH.match(url.path)
+        if match is None:
+            return self._reply(404, {'error': {'code': 404, 'message': 'Not Found'}})
+
+        calendar_id = unquote(match['calendar_id'])
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        time.sleep(self.server.page_latency(calendar_id))
+        if calendar_id not in self.server.events:
+            return self._reply(404, {'error': {'code': 404, 'message': 'Not Found'}})
+
+        page = self.server.list_events(
+            calendar_id, query.get('syncToken'), query.get('pageToken'), int(query.get('maxResults', PAGE_SIZE))
+        )
+        if page is None:
+            return self._reply(410, {'error': {'code': 410, 'message': 'Sync token is no longer valid'}})
+        self._reply(200, page)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def leave_events(prefix, count, names, first_year=2025, years=1, seed=0):
+    # All-day leave events of 1 to 15 days, named after the team members. The end date is exclusive, as in the API
+    rng = np.random.default_rng(seed)
+    first_day = datetime.date(first_year, 1, 1)
+    days = (datetime.date(first_year + years, 1, 1) - first_day).days
+    starts = rng.integers(0, days, count)
+    lengths = rng.integers(1, 16, count)
+    members = rng.choice(names, count)
+    return [
+        {
+            'id': f'{prefix}{i}',
+            'status': 'confirmed',
+            'summary': str(member),
+            'start': {'date': str(first_day + datetime.timedelta(days=int(start)))},
+            'end': {'date': str(first_day + datetime.timedelta(days=int(start + length)))},
+        }
+        for i, (start, length, member) in enumerate(zip(starts, lengths, members))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake leave calendars with the Google Calendar API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--calendars', default='oficina-a,oficina-b', help="Calendar ids, comma separated")
+    parser.add_argument('--events', type=int, default=1000, help="Events of each calendar")
+    parser.add_argument('--members', type=int, default=30, help="Team members the events are named after")
+    parser.add_argument('--first-year', type=int, default=2025)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to answer each page")
+    args = parser.parse_args()
+
+    # The names of benchmarks/generate_data.py
+    names = [f'Miembro {i:04d}' for i in range(1, args.members + 1)]
+    server = FakeCalendarServer(('127.0.0.1', args.port), args.latency)
+    for seed, calendar_id in enumerate(args.calendars.split(',')):
+        server.put_events(
+            calendar_id, leave_events(f'{calendar_id}-', args.events, names, args.first_year, args.years, seed)
+        )
+    print(f"Serving {args.calendars} at {server.endpoint}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
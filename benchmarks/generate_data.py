@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils.storage import SCHEMA
+
+# Synthetic planning data for the benchmarks: a store with the schema of utils.storage, filled with random team
+# members, project assignments and Boost cells. The same arguments and seed always give the same data
+
+MONTHS = [
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Setiembre', 'Octubre', 'Noviembre', 'Diciembre'
+]
+ROLES = ['Researcher', 'Engineer', 'Manager']
+GRADES = ['Junior', 'Semi Senior', 'Senior']
+MONTHLY_HOURS = [8, 20, 40, 60, 80, 120, 160]
+LABELS = ['Licencia', 'Preventa', 'Artículo', 'Formación']
+
+
+def generate_team_members(rng, members):
+    capacity = rng.choice([80, 120, 160], size=(members, 1)) * np.ones((1, len(MONTHS)), dtype=int)
+    return pd.DataFrame({
+        'id': np.arange(1, members + 1),
+        'Nombre': [f'Miembro {i:04d}' for i in range(1, members + 1)],
+        'Rol': rng.choice(ROLES, members),
+        'Grado': rng.choice(GRADES, members),
+        **{month: capacity[:, i] for i, month in enumerate(MONTHS)},
+    })
+
+
+def generate_projects(rng, names, assignments, first_year, years):
+    # Assignments from two weeks to a year long, starting anywhere in the years
+    first_day = np.datetime64(f'{first_year}-01-01')
+    days = (np.datetime64(f'{first_year + years}-01-01') - first_day).astype(int)
+    starts = first_day + rng.integers(0, days, assignments)
+    ends = starts + rng.integers(14, 365, assignments)
+    return pd.DataFrame({
+        'id': np.arange(1, assignments + 1),
+        'Proyecto': [f'Proyecto {i:03d}' for i in rng.integers(1, max(assignments // 5, 2), assignments)],
+        'Tipo': rng.choice(['Facturable', 'No facturable'], assignments, p=[0.8, 0.2]),
+        'Inicio': pd.to_datetime(starts).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'Fin': pd.to_datetime(ends).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'Equipo': rng.choice(names, assignments),
+        'HorasMes': rng.choice(MONTHLY_HOURS, assignments),
+    })
+
+
+def generate_boost_hours(rng, names, first_year, years, density):
+    # A fraction `density` of the (member, week) cells is filled: hours, or a label one time out of ten
+    first_monday = np.datetime64(f'{first_year}-01-01')
+    first_monday -= (first_monday.astype(int) + 3) % 7
+    week_starts = np.arange(first_monday, np.datetime64(f'{first_year + years}-01-01'), 7)
+
+    member, week = np.nonzero(rng.random((len(names), len(week_starts))) < density)
+    is_label = rng.random(len(member)) < 0.1
+    return pd.DataFrame({
+        'member': np.asarray(names)[member],
+        'week_start': week_starts[week].astype(str),
+        'hours': np.where(is_label, np.nan, rng.choice([2, 4, 8, 16], len(member))),
+        'label': np.where(is_label, rng.choice(LABELS, len(member)), None),
+    })
+
+
+def generate(path, members=30, assignments=500, years=1, first_year=2025, boost_density=0.2, seed=0):
+    # Write a new store at `path` and return its tables
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = np.random.default_rng(seed)
+    team_members = generate_team_members(rng, members)
+    names = team_members['Nombre'].tolist()
+    projects = generate_projects(rng, names, assignments, first_year, years)
+    boost_hours = generate_boost_hours(rng, names, first_year, years, boost_density)
+
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+        team_members.to_sql('team_members', connection, if_exists='append', index=False)
+        projects.to_sql('projects', connection, if_exists='append', index=False)
+        boost_hours.to_sql('boost_hours', connection, if_exists='append', index=False)
+    engine.dispose()
+
+    return team_members, projects, boost_hours
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic planning database")
+    parser.add_argument('path', help="SQLite file to create (replaced if it exists)")
+    parser.add_argument('--members', type=int, default=30, help="Team members")
+    parser.add_argument('--assignments', type=int, default=500, help="Project assignments")
+    parser.add_argument('--years', type=int, default=1, help="Years the assignments and Boost cells span")
+    parser.add_argument('--first-year', type=int, default=2025, help="First year of the data")
+    parser.add_argument('--boost-density', type=float, default=0.2, help="Fraction of filled Boost cells")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    team_members, projects, boost_hours = generate(
+        args.path, args.members, args.assignments, args.years, args.first_year, args.boost_density, args.seed
+    )
+    print(
+        f"{args.path}: {len(team_members)} team members, {len(projects)} assignments, "
+        f"{len(boost_hours)} Boost cells"
+    )
+
+
+if __name__ == '__main__':
+    main()
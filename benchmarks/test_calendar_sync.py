@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import text
+
+from utils.storage import engine
+from pages import holidays
+from pages.holidays import load_holidays, sync_calendars, sync_holidays
+
+from conftest import FIRST_YEAR
+from fake_calendar import FakeCalendarServer, leave_events
+
+CALENDARS = ['oficina-a', 'oficina-b', 'oficina-c', 'oficina-d']
+EVENTS = 2000  # Per calendar: 2 pages of 1000
+LATENCY = 0.1  # Seconds per page
+ROUNDS = 5
+
+
+@pytest.fixture(scope='module')
+def calendar_server(synthetic_data):
+    # The real client (fetch_google_events_page) asks the local stand-in server
+    team_members, _, _ = synthetic_data
+    server = FakeCalendarServer(latency=LATENCY).start()
+    for seed, calendar_id in enumerate(CALENDARS):
+        server.put_events(
+            calendar_id, leave_events(f'{calendar_id}-', EVENTS, team_members['Nombre'], FIRST_YEAR, seed=seed)
+        )
+    endpoint = holidays.CALENDAR_ENDPOINT
+    holidays.CALENDAR_ENDPOINT = server.endpoint
+    yield server
+    holidays.CALENDAR_ENDPOINT = endpoint
+    server.stop()
+
+
+def forget_calendars(calendar_ids=CALENDARS):
+    # The next sync of the calendars is a full one
+    with engine.begin() as connection:
+        for calendar_id in calendar_ids:
+            connection.execute(text("DELETE FROM holidays WHERE calendar_id = :id"), {'id': calendar_id})
+            connection.execute(text("DELETE FROM holidays_sync WHERE calendar_id = :id"), {'id': calendar_id})
+
+
+def stored_events(calendar_id):
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT COUNT(*) FROM holidays WHERE calendar_id = :id"), {'id': calendar_id}
+        ).scalar()
+
+
+def sync_sequentially(calendar_ids):
+    for calendar_id in calendar_ids:
+        sync_holidays(calendar_id=calendar_id)
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'concurrent'])
+def test_sync_calendars(benchmark, calendar_server, mode):
+    # Full sync of every calendar. Concurrently it takes about the time of one calendar
+    def sync():
+        if mode == 'sequential':
+            return sync_sequentially(CALENDARS)
+        return sync_calendars(CALENDARS)
+
+    errors = benchmark.pedantic(sync, setup=forget_calendars, rounds=ROUNDS)
+    assert not errors
+    assert [stored_events(calendar_id) for calendar_id in CALENDARS] == [EVENTS] * len(CALENDARS)
+    assert len(load_holidays(FIRST_YEAR, CALENDARS)) == EVENTS * len(CALENDARS)
@@ -0,0 +1,129 @@
+import itertools
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from utils.cache import bump_revision
+from utils.calendar_dimension import build_calendar_range
+from utils.interval_index import IntervalIndex
+from utils.intervals import to_days
+from utils.planning import horizon_bounds
+from utils.storage import engine
+from pages.assignation_boost import load_boost_assignation
+from pages.assignation_projects import compute_assignation_hours, monthly_assignation
+from pages.boost import compute_weekly_assignation, compute_weekly_free_hours, generate_weeks
+from pages.metrics import MONTHS, monthly_utilization
+from pages.projects import _update_projects, read_project_rows
+
+from conftest import FIRST_YEAR
+
+YEAR = FIRST_YEAR + 1
+ROUNDS = 20
+
+# Ranges of the weekly engines: the default rolling horizon in the middle of the data, and a whole year
+RANGES = {
+    'horizon': horizon_bounds(f'{YEAR}-06-15'),
+    'year': (f'{YEAR}-01-01', f'{YEAR}-12-31'),
+}
+
+
+# Intervals of the index benchmark: the assignments, and the same plus a few that span every year of the data (an
+# open-ended assignment, or a long leave), which mustn't make the queries of a week scan every assignment
+LONG_INTERVALS = {'short': 0, 'long': 20}
+
+
+def cold_caches():
+    # Every round computes from the store: new revisions invalidate the derived data and the project index
+    for table in ['projects', 'team_members', 'holidays', 'boost_hours']:
+        bump_revision(table)
+    build_calendar_range.cache_clear()
+
+
+def run_cold(benchmark, func, *args):
+    return benchmark.pedantic(func, args=args, setup=cold_caches, rounds=ROUNDS, warmup_rounds=1)
+
+
+def test_generate_weeks(benchmark):
+    weeks = run_cold(benchmark, generate_weeks, YEAR)
+    assert list(weeks.columns) == list(range(1, 54))
+
+
+def test_compute_assignation_hours(benchmark, synthetic_data):
+    _, projects, _ = synthetic_data
+    assignation_hours = run_cold(benchmark, compute_assignation_hours, YEAR)
+    assert len(assignation_hours) == len(projects)
+
+
+@pytest.mark.parametrize('period', RANGES)
+def test_compute_weekly_assignation(benchmark, synthetic_data, period):
+    team_members, _, _ = synthetic_data
+    weeks, assignation = run_cold(benchmark, compute_weekly_assignation, *RANGES[period])
+    assert len(assignation) == len(team_members) + 2
+
+
+@pytest.mark.parametrize('period', RANGES)
+def test_compute_weekly_free_hours(benchmark, synthetic_data, period):
+    team_members, _, _ = synthetic_data
+    weeks, free_hours = run_cold(benchmark, compute_weekly_free_hours, *RANGES[period])
+    assert len(free_hours) == len(team_members) + 2
+
+
+@pytest.mark.parametrize('intervals', LONG_INTERVALS)
+def test_interval_overlapping(benchmark, synthetic_data, intervals):
+    # Queries of the assignments of each week of a year, and of each month
+    _, projects, _ = synthetic_data
+    long_count = LONG_INTERVALS[intervals]
+    first_day, last_day = to_days([f'{FIRST_YEAR}-01-01', f'{FIRST_YEAR + 2}-12-31']).astype(np.int64)
+    index = IntervalIndex(
+        projects['id'].tolist() + [f'long-{i}' for i in range(long_count)],
+        np.concatenate([to_days(projects['Inicio']).astype(np.int64), np.full(long_count, first_day)]),
+        np.concatenate([to_days(projects['Fin']).astype(np.int64), np.full(long_count, last_day)]),
+    )
+    weeks = to_days([f'{YEAR}-01-01']).astype(np.int64)[0] + 7 * np.arange(53)
+    queries = [(start, start + 6) for start in weeks.tolist()] + [(start, start + 29) for start in weeks[::4].tolist()]
+
+    def query():
+        return sum(len(index.overlapping(start, end)) for start, end in queries)
+
+    hits = benchmark.pedantic(query, rounds=ROUNDS, warmup_rounds=1)
+    assert hits >= len(queries) * long_count
+
+
+def test_load_boost_assignation(benchmark, synthetic_data):
+    team_members, _, boost_hours = synthetic_data
+    start, end = RANGES['horizon']
+    boost_assignation, _ = run_cold(benchmark, load_boost_assignation, start, end)
+    assert len(boost_assignation) == len(team_members) + 3
+    in_horizon = boost_hours[(boost_hours['week_start'] >= start) & (boost_hours['week_start'] <= end)]
+    assert (boost_assignation.iloc[2:-1, 1:] != '').to_numpy().sum() == len(in_horizon)
+
+
+def test_project_edit(benchmark, synthetic_data):
+    # Edit-to-refresh latency: one assignment changes its hours, then the tables that use it are read again. They are
+    # updated from the change, so the time doesn't grow with the number of assignments
+    _, projects, _ = synthetic_data
+    project_id = int(projects['id'].iloc[len(projects) // 2])
+    hours = itertools.cycle([8, 160])
+    start, end = RANGES['horizon']
+
+    def warm_caches():
+        compute_weekly_free_hours(start, end)
+        monthly_assignation(YEAR)
+        monthly_utilization(YEAR)
+
+    def edit_project():
+        with engine.begin() as connection:
+            before = read_project_rows(connection, [project_id])
+            connection.execute(
+                text('UPDATE projects SET "HorasMes" = :hours WHERE id = :id'), {'hours': next(hours), 'id': project_id}
+            )
+            after = read_project_rows(connection, [project_id])
+        _update_projects(before, after)
+        return compute_weekly_free_hours(start, end), monthly_assignation(YEAR), monthly_utilization(YEAR)
+
+    (weeks, free_hours), assignation_hours, utilization = benchmark.pedantic(
+        edit_project, setup=warm_caches, rounds=ROUNDS, warmup_rounds=1
+    )
+    assert len(assignation_hours) == len(projects)
+    assert (utilization.sum() == assignation_hours[MONTHS].sum()).all()
@@ -0,0 +1,151 @@
+import collections
+import hashlib
+import json
+import threading
+from datetime import date
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+
+from utils.cache import get_revision, refresh_revisions
+from utils.planning import MAX_WEEKS, horizon_bounds, planning_year
+from utils.storage import init_storage
+from pages.assignation_boost import read_boost_hours, read_member_boost_hours
+from pages.assignation_projects import compute_assignation_hours
+from pages.assignation_total import compute_assingation_hours_total
+from pages.boost import compute_weekly_free_hours
+from pages.holidays import sync_work_calendars
+
+# Headless HTTP service with the same engines as the app, for tools that poll the planning:
+#     uvicorn api:app --app-dir src
+# Responses carry an ETag computed from the revisions of the tables they depend on, so a client sending it back in
+# If-None-Match gets a 304 until the data changes. Bodies are cached by ETag, nothing is recomputed per request
+
+CACHED_RESPONSES = 128
+init_storage()
+
+app = FastAPI(title="Planning")
+
+_responses = collections.OrderedDict()  # ETag -> JSON body, least recently used first
+_responses_lock = threading.Lock()
+
+
+def etag_for(key, tables):
+    revisions = tuple(get_revision(table) for table in tables)
+    digest = hashlib.sha1(repr((key, revisions)).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def cached_json(request, key, tables, compute):
+    # JSON response of compute(), or 304 when the client already has it
+    if 'holidays' in tables:
+        sync_work_calendars()
+    refresh_revisions()
+    etag = etag_for(key, tables)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+    # Weak comparison (RFC 9110): W/"x" matches "x"
+    tags = [tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')]
+    if etag in tags or '*' in tags:
+        return Response(status_code=304, headers=headers)
+
+    with _responses_lock:
+        body = _responses.get(etag)
+        if body is not None:
+            _responses.move_to_end(etag)
+    if body is None:
+        body = json.dumps(compute(), ensure_ascii=False)
+        with _responses_lock:
+            _responses[etag] = body
+            while len(_responses) > CACHED_RESPONSES:
+                _responses.popitem(last=False)
+
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def horizon(start, end):
+    # The range from start to end ('YYYY-MM-DD', both or neither), by default the planning horizon. 422 when it isn't
+    # a valid range of at most MAX_WEEKS weeks
+    if start is None and end is None:
+        return horizon_bounds()
+    if start is None or end is None:
+        raise HTTPException(422, "start and end must be given together")
+    try:
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(422, "start and end must be dates as YYYY-MM-DD")
+    if first > last:
+        raise HTTPException(422, "start must not be after end")
+
+    # Weeks from the Monday of the week of start
+    if (last - first).days + first.weekday() >= 7 * MAX_WEEKS:
+        raise HTTPException(422, f"The range can't span more than {MAX_WEEKS} weeks")
+    return str(first), str(last)
+
+
+@app.get('/assignation/projects')
+def assignation_projects(request: Request, year: int | None = Query(None, ge=1900, le=2200)):
+    # Hours of each assignment in each month of the year
+    if year is None:
+        year = planning_year()
+    return cached_json(
+        request, ('assignation_projects', year), ['projects', 'team_members', 'holidays'],
+        lambda: {'year': year, 'assignations': records(compute_assignation_hours(year))}
+    )
+
+
+@app.get('/assignation/members')
+def assignation_members(request: Request, year: int | None = Query(None, ge=1900, le=2200)):
+    # Hours assigned to each team member in each month of the year
+    if year is None:
+        year = planning_year()
+    return cached_json(
+        request, ('assignation_members', year), ['projects', 'team_members', 'holidays'],
+        lambda: {'year': year, 'members': records(compute_assingation_hours_total(year))}
+    )
+
+
+@app.get('/free-hours')
+def free_hours(request: Request, start: str = None, end: str = None):
+    # Free hours of each team member in each week from start to end (by default the planning horizon)
+    start, end = horizon(start, end)
+
+    def compute():
+        weeks, free_hours = compute_weekly_free_hours(start, end)
+        members = free_hours.iloc[2:].set_index('Semana')
+        return {
+            'start': start,
+            'end': end,
+            'weeks': [
+                {'week': str(week), 'start': weeks.loc['Monday', week], 'end': weeks.loc['Sunday', week]}
+                for week in weeks.columns
+            ],
+            'members': [
+                {'member': member, 'hours': [int(hours) for hours in row]}
+                for member, row in members.iterrows()
+            ],
+        }
+
+    return cached_json(request, ('free_hours', start, end), ['projects', 'team_members', 'holidays'], compute)
+
+
+@app.get('/boost')
+def boost(request: Request, start: str = None, end: str = None):
+    # Boost cells of the weeks starting from start to end (by default the planning horizon)
+    start, end = horizon(start, end)
+    return cached_json(
+        request, ('boost', start, end), ['boost_hours'],
+        lambda: {'start': start, 'end': end, 'cells': records(read_boost_hours(start, end))}
+    )
+
+
+@app.get('/boost/members/{member}')
+def boost_member(request: Request, member: str):
+    # Every Boost cell of a team member
+    return cached_json(
+        request, ('boost_member', member), ['boost_hours'],
+        lambda: {'member': member, 'cells': records(read_member_boost_hours(member))}
+    )
@@ -1,51 +1,69 @@
+import importlib
 import streamlit as st
+from utils.cache import refresh_revisions
 from utils.config_markdown import apply_all_configs
+from utils.profiling import ENABLED as PROFILING_ENABLED, rerun
+from utils.storage import init_storage
+from pages.holidays import sync_work_calendars
 
 apply_all_configs()
+init_storage()
 
 LANDINGS = [
     "Proyectos", "Licencias", "Equipo", "Asignación a proyectos", "Asignación total", "Métricas", "Boost",
     "Asignación a Boost"
 ]
 
-def main():
-    from pages.projects import show_projects
-    from pages.holidays import show_holidays
-    from pages.team import show_team
-    from pages.assignation_projects import show_assignation_projects
-    from pages.assignation_total import show_assignation_total
-    from pages.metrics import show_metrics
-    from pages.boost import show_boost
-    from pages.assignation_boost import show_assignation_boost
+# Page module and function of each landing. Modules are imported the first time their page is visited
+PAGES = {
+    "Proyectos": ("pages.projects", "show_projects"),
+    "Licencias": ("pages.holidays", "show_holidays"),
+    "Equipo": ("pages.team", "show_team"),
+    "Asignación a proyectos": ("pages.assignation_projects", "show_assignation_projects"),
+    "Asignación total": ("pages.assignation_total", "show_assignation_total"),
+    "Métricas": ("pages.metrics", "show_metrics"),
+    "Boost": ("pages.boost", "show_boost"),
+    "Asignación a Boost": ("pages.assignation_boost", "show_assignation_boost"),
+}
+
+# The Diagnóstico page (timings of the reruns) only exists when profiling is enabled
+if PROFILING_ENABLED:
+    LANDINGS.append("Diagnóstico")
+    PAGES["Diagnóstico"] = ("pages.diagnostics", "show_diagnostics")
 
-    # st.title("Project Management System")
 
+def select_landing():
+    # The selected page lives in the session and in the URL, so reloads and shared links open the same page
     if 'selected_tab' not in st.session_state:
-        st.session_state.selected_tab = LANDINGS[0]
-
-    tabs = st.tabs(LANDINGS)
-
-    for i, (tab, landing) in enumerate(zip(tabs, LANDINGS)):
-        with tab:
-            if landing == "Proyectos":
-                show_projects()
-            elif landing == "Licencias":
-                show_holidays()
-            elif landing == "Equipo":
-                show_team()
-            elif landing == "Asignación a proyectos":
-                show_assignation_projects()
-            elif landing == "Asignación total":
-                show_assignation_total()
-            elif landing == "Métricas":
-                show_metrics()
-            elif landing == "Boost":
-                show_boost()
-            elif landing == "Asignación a Boost":
-                show_assignation_boost()
-        if tab:
-            st.session_state.selected_tab = landing
-            st.query_params = {"selected_tab": st.session_state.selected_tab}
+        landing = st.query_params.get('selected_tab')
+        st.session_state.selected_tab = landing if landing in PAGES else LANDINGS[0]
+
+    landing = st.radio(
+        "Página", LANDINGS, key='selected_tab', horizontal=True, label_visibility='collapsed'
+    )
+    st.query_params['selected_tab'] = landing
+    return landing
+
+
+def main():
+    # st.title("Project Management System")
+
+    # Saves made by other processes (e.g. the API) invalidate the cached data too
+    refresh_revisions()
+
+    # The capacity of every page counts the holidays and leave of the calendars, not only when Licencias is open.
+    # When they can't be synced without logging in, the session is told once
+    skipped = sync_work_calendars()
+    if skipped and not st.session_state.get('calendar_sync_reported'):
+        st.session_state.calendar_sync_reported = True
+        st.toast(skipped, icon="⚠️")
+
+    # Only the visible page runs on each rerun
+    landing = select_landing()
+    module_name, function_name = PAGES[landing]
+    with rerun(landing):
+        show_page = getattr(importlib.import_module(module_name), function_name)
+        show_page()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
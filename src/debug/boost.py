@@ -1,11 +1,19 @@
+import os
+import sys
+
 import pandas as pd
-import numpy as np
-import calendar
 import streamlit as st
-from datetime import datetime, timedelta
 
-from src.pages.team import load_team_members
-from src.pages.assignation_total import compute_assingation_hours_total
+# The app's import root (src), as when it runs with `streamlit run src/app.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.calendar_dimension import year_calendar
+from utils.storage import init_storage
+from pages.team import load_team_members
+from pages.boost import generate_weeks
+from pages.assignation_total import compute_assingation_hours_total
+
+init_storage()
 
 YEAR = 2025
 MONTHS = [
@@ -15,43 +23,8 @@ MONTHS = [
 
 
 def compute_workable_days(month):
-    # Calculate the total workable days (excluding Saturdays and Sundays) in the current month
-    month_index = MONTHS.index(month) + 1
-    month_start = datetime(2025, month_index, 1)
-    month_end = datetime(2025, month_index, calendar.monthrange(2025, month_index)[1])
-    all_days = pd.date_range(start=month_start, end=month_end, freq='D')
-    workable_days = np.sum(np.isin(all_days.weekday, range(5)))
-    return workable_days
-
-
-def generate_weeks(year):
-    # Start from the first Monday of the year or the last Monday of the previous year
-    start_date = datetime(year, 1, 1)
-    if start_date.weekday() != 0:
-        start_date -= timedelta(days=start_date.weekday())
-
-    weeks = []
-    week_number = 1
-    while start_date.year == year or (start_date + timedelta(days=6)).year == year:
-        end_date = start_date + timedelta(days=6)
-
-        # How many days of this week belong to each month
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')  # Date range for the current week
-        # date_range = date_range[date_range.year == year]  # Filter dates to this year
-        date_range = date_range[(date_range.year == year) & (date_range.weekday < 5)]  # Filter dates to this year and weekdays
-        days_in_month = date_range.to_series().dt.month.value_counts().sort_index()
-        days_in_month = {month: days_in_month.get(month, 0) for month in range(1, 13)}
-
-        weeks.append({
-            'index': week_number,
-            'Monday': start_date.strftime('%Y-%m-%d'),
-            'Sunday': end_date.strftime('%Y-%m-%d'),
-            **{f'{MONTHS[month - 1]}': days for month, days in days_in_month.items()},
-        })
-        start_date += timedelta(days=7)
-        week_number += 1
-
-    return pd.DataFrame(weeks).set_index('index').T
+    # Total workable days (excluding Saturdays and Sundays) in the month
+    return year_calendar(YEAR).month_business_days[MONTHS.index(month)]
 
 
 # Team members
@@ -64,7 +37,7 @@ weeks = generate_weeks(YEAR)
 
 # Assignation for each week
 assignation_weeks = pd.DataFrame(columns=weeks.columns, index=team_members_names)
-monthly_hours = compute_assingation_hours_total()
+monthly_hours = compute_assingation_hours_total(YEAR)
 for week in weeks.columns:
     for member in team_members_names:
         month = weeks[week][MONTHS].idxmax()
@@ -1,13 +1,20 @@
+import os
+import sys
 
 import pandas as pd
-import numpy as np
-import calendar
 import streamlit as st
 from datetime import datetime, timedelta
 
-from src.pages.team import load_team_members
-from src.pages.projects import load_projects
-from src.pages.boost import generate_weeks
+# The app's import root (src), as when it runs with `streamlit run src/app.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.calendar_dimension import year_calendar
+from utils.storage import init_storage
+from pages.team import load_team_members
+from pages.projects import load_projects
+from pages.boost import generate_weeks
+
+init_storage()
 
 YEAR = 2025
 MONTHS = [
@@ -30,11 +37,7 @@ def get_month(week_start, week_end):
 
 
 def compute_month_business_days(month):
-    return len(pd.date_range(
-        start=pd.Timestamp(year=YEAR, month=month, day=1),
-        end=pd.Timestamp(year=YEAR, month=month, day=calendar.monthrange(YEAR, month)[1]),
-        freq='B'
-    ))
+    return year_calendar(YEAR).month_business_days[month - 1]
 
 
 def distribute_hours(project_start_date, project_end_date, hours_by_month, week_start, week_end):
@@ -1,63 +1,152 @@
-import time
+import numpy as np
 import pandas as pd
-import sqlalchemy.exc
 import streamlit as st
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
 from st_aggrid.grid_options_builder import GridOptionsBuilder
 
+from utils.boost_grid import HEADER_ROWS, cell_records, cell_text, grid_to_cells
+from utils.cache import bump_revision, derived
+from utils.calendar_dimension import build_calendar_range
+from utils.planning import horizon_bounds
+from utils.profiling import timer
+from utils.storage import engine
+from utils.writer import report_write, submit_write
 from .boost import compute_weekly_free_hours, compute_next_week_column
 
-DATABASE_URL = "sqlite:///data/boost_assignation.db"
-engine = create_engine(DATABASE_URL)
 
+UPSERT_CELL = text(
+    "INSERT INTO boost_hours (member, week_start, hours, label) VALUES (:member, :week_start, :hours, :label) "
+    "ON CONFLICT (member, week_start) DO UPDATE SET hours = excluded.hours, label = excluded.label"
+)
+DELETE_CELL = text("DELETE FROM boost_hours WHERE member = :member AND week_start = :week_start")
 
-def load_boost_assignation():
-    weeks, free_hours = compute_weekly_free_hours()
 
-    try:
-        query = "SELECT * FROM boost_assignation"
-        df = pd.read_sql(query, engine)
-        columns = ['Semana'] + [col for col in df.columns if col != 'Semana']
-        boost_assignation = df[columns]
+@derived('boost_hours')
+def read_boost_hours(start, end):
+    # Cells of the Boost grid of the weeks starting from start to end: (member, week_start, hours, label). Cells
+    # hold hours, or a label when the value typed in the grid isn't a number
+    query = text(
+        "SELECT member, week_start, hours, label FROM boost_hours WHERE week_start BETWEEN :start AND :end"
+    )
+    return pd.read_sql(query, engine, params={'start': str(start), 'end': str(end)})
 
-    except sqlalchemy.exc.OperationalError:
-        # st.error(f"Error loading boost assignations: {e}")
 
-        boost_assignation = pd.DataFrame(columns=free_hours.columns, index=free_hours['Semana'])
-        boost_assignation = boost_assignation.drop(columns=['Semana'])
-        boost_assignation.loc['_Inicio'] = weeks.loc[
-            'Monday'].values  # Full format of the date. useful for comparing with today()
-        boost_assignation.reset_index(inplace=True)
-        boost_assignation = boost_assignation.fillna('')
-        boost_assignation.iloc[0] = free_hours.iloc[0].values  # Inicio
-        boost_assignation.iloc[1] = free_hours.iloc[1].values  # Fin
+def read_member_boost_hours(member):
+    query = text("SELECT week_start, hours, label FROM boost_hours WHERE member = :member ORDER BY week_start")
+    return pd.read_sql(query, engine, params={'member': member})
 
-    return boost_assignation, free_hours
 
+def read_week_boost_hours(week_start):
+    query = text("SELECT member, hours, label FROM boost_hours WHERE week_start = :week_start ORDER BY member")
+    return pd.read_sql(query, engine, params={'week_start': str(week_start)})
 
-def save_boost_assignation(df):
-    df.to_sql('boost_assignation', engine, if_exists='replace', index=False)
 
+def diff_cells(persisted, edited, members, week_starts):
+    # Cells to upsert and to delete. Only the cells shown in the grid (its members and weeks) are compared
+    key = ['member', 'week_start']
+    persisted = persisted[persisted['member'].isin(members) & persisted['week_start'].isin(week_starts)]
+    merged = edited.merge(persisted, on=key, how='outer', suffixes=('', '_persisted'), indicator=True)
 
-def show_assignation_boost():
-    boost_assignation, free_hours = load_boost_assignation()
+    same_hours = (merged['hours'] == merged['hours_persisted']) | (merged['hours'].isna() & merged['hours_persisted'].isna())
+    same_label = (merged['label'] == merged['label_persisted']) | (merged['label'].isna() & merged['label_persisted'].isna())
+    upserted = merged[(merged['_merge'] == 'left_only') | ((merged['_merge'] == 'both') & ~(same_hours & same_label))]
+    deleted = merged[merged['_merge'] == 'right_only']
+
+    return upserted[key + ['hours', 'label']], deleted[key]
 
-    def save_changes():
-        try:
-            # Get the updated data from session state
-            if 'edited_data' in st.session_state:
-                updated_df = pd.DataFrame(st.session_state.edited_data)
-                save_boost_assignation(updated_df)
-                message = st.success('Changes saved successfully!', icon="✅")
-            else:
-                message = st.warning('No changes to save.')
 
-        except Exception as e:
-            message = st.error(f"Error saving changes: {e}")
+@derived('projects', 'team_members', 'holidays', 'boost_hours')
+def load_boost_assignation(start, end):
+    # The grid shown in AgGrid for the weeks from start to end, pivoted from the cells: the Inicio/Fin header rows,
+    # one row per team member and the _Inicio row with the full start date of each week
+    weeks, free_hours = compute_weekly_free_hours(start, end)
+    calendar_dim = build_calendar_range(start, end)
+    week_starts = calendar_dim.week_starts.astype(str)
 
-        time.sleep(1)
-        message.empty()
+    boost_assignation = pd.DataFrame('', columns=free_hours.columns[1:], index=free_hours['Semana'])
+    boost_assignation.iloc[0] = free_hours.iloc[0, 1:].values  # Inicio
+    boost_assignation.iloc[1] = free_hours.iloc[1, 1:].values  # Fin
+    boost_assignation.loc['_Inicio'] = week_starts  # Full format of the date. useful for comparing with today()
+
+    cells = read_boost_hours(start, end)
+    members = boost_assignation.index[2:-1]
+    cells = cells[cells['member'].isin(members) & cells['week_start'].isin(week_starts)]
+    if not cells.empty:
+        values = pd.Series(
+            [cell_text(hours, label) for hours, label in zip(cells['hours'], cells['label'])],
+            index=[cells['member'], cells['week_start']]
+        ).unstack().rename(columns=dict(zip(week_starts, boost_assignation.columns)))
+        boost_assignation.loc[values.index, values.columns] = values.fillna('')
+
+    boost_assignation.index.name = 'Semana'
+    boost_assignation.reset_index(inplace=True)
+
+    return boost_assignation, free_hours
+
+
+def save_boost_assignation(df, loaded):
+    # Queue an upsert of the cells that changed with respect to `loaded`, the grid the session edited. Cells other
+    # sessions saved since it was loaded are left as they are. Returns the write ticket, or None when nothing changed
+    edited = grid_to_cells(df)
+    grid = df.set_index('Semana')
+    members = grid.index.drop(HEADER_ROWS, errors='ignore')
+    week_starts = grid.loc['_Inicio'].tolist()
+    if loaded.set_index('Semana').loc['_Inicio'].tolist() == week_starts:
+        persisted = grid_to_cells(loaded)
+    else:
+        # Another horizon (the grid was loaded before the week changed): compared with the stored cells
+        persisted = read_boost_hours(min(week_starts), max(week_starts))
+    upserted, deleted = diff_cells(persisted, edited, members, week_starts)
+    if upserted.empty and deleted.empty:
+        return None
+
+    upserted = cell_records(upserted)
+    deleted = deleted.to_dict('records')
+
+    def write(connection):
+        if deleted:
+            connection.execute(DELETE_CELL, deleted)
+        if upserted:
+            connection.execute(UPSERT_CELL, upserted)
+
+    return submit_write(engine, write, on_commit=lambda: bump_revision('boost_hours'))
+
+
+def low_free_hours_flags(free_hours, threshold=3):
+    # Grid context for the cell styles: which team members have at most `threshold` free hours in each week
+    weeks = free_hours.columns[1:]
+    members = free_hours.iloc[2:]
+    low = members[weeks].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy() <= threshold
+    return {
+        'weekColumns': {week: i for i, week in enumerate(weeks)},
+        'lowFreeHours': {
+            member: ''.join(np.where(row, '1', '0')) for member, row in zip(members['Semana'], low)
+        },
+    }
+
+
+def show_assignation_boost():
+    report_write('boost_assignation_write')
+
+    horizon = horizon_bounds()
+    boost_assignation, free_hours = load_boost_assignation(*horizon)
+
+    # The grid shown in the previous rerun, the one the session's edits are relative to. The grid follows the shared
+    # snapshot, except while a save of the session is in flight (the snapshot doesn't have it yet)
+    loaded = st.session_state.get('boost_assignation_grid')
+    if loaded is not None and 'boost_assignation_write' in st.session_state:
+        boost_assignation = loaded
+
+    def save_changes(updated_data):
+        edited = pd.DataFrame(updated_data)[boost_assignation.columns]
+        ticket = save_boost_assignation(edited, boost_assignation if loaded is None else loaded)
+        if ticket is None:
+            st.toast('No changes to save.')
+            return
+        st.session_state.boost_assignation_write = ticket
+        st.session_state.boost_assignation_grid = edited
+        report_write('boost_assignation_write')
 
     # Configure AgGrid options
     gb = GridOptionsBuilder.from_dataframe(boost_assignation)
@@ -70,50 +159,25 @@ def show_assignation_boost():
         enableRangeSelection=True
     )
 
-    # Generate a JavaScript function to conditionally color cells based on free_hours
-    # Convert free_hours DataFrame to a format usable in JavaScript
-    free_hours_data = {}
-
-    # Skip the first column ('Semana') and the first two rows (headers)
-    for col in free_hours.columns[1:]:
-        col_values = {}
-        for idx, row in free_hours.iterrows():
-            if idx > 1:  # Skip the first two header rows
-                col_values[str(idx)] = float(row[col]) if pd.notna(row[col]) and row[col] != '' else 0
-        free_hours_data[col] = col_values
-
-    # Create JavaScript object string representation
-    js_free_hours = str(free_hours_data).replace("'", '"')
+    # Cells with few free hours are grayed. The flags reach the grid once, in its context: one string of 0/1 per team
+    # member (a character per week column) and the position of each week column
+    gb.configure_grid_options(context=low_free_hours_flags(free_hours))
 
     # JavaScript function to apply conditional styling based on free_hours values
-    cell_style_function = JsCode(f"""
-    function(params) {{
-        // Free hours data from Python
-        const freeHoursData = {js_free_hours};
-
-        // Default style
-        let style = {{
+    cell_style_function = JsCode("""
+    function(params) {
+        let style = {
             'borderRight': '1px solid #ddd'
-        }};
-
-        // Skip the first column and the first two rows (headers)
-        if (params.colDef.field !== 'Semana' && params.node.rowIndex > 1) {{
-            const colName = params.colDef.field;
-            const rowIdx = params.node.rowIndex;  // Adjust index to match free_hours DataFrame
+        };
 
-            // Check if we have data for this cell
-            if (freeHoursData[colName] && freeHoursData[colName][rowIdx] !== undefined) {{
-                const freeHours = freeHoursData[colName][rowIdx];
-
-                // Apply gray background color if free_hours <= 3
-                if (freeHours <= 3) {{
-                    style['backgroundColor'] = '#e0e0e0';  // Gray for cells with <=3 free hours
-                }}
-            }}
-        }}
+        // Apply gray background color if free_hours <= 3
+        const flags = params.context.lowFreeHours[params.data.Semana];
+        if (flags !== undefined && flags[params.context.weekColumns[params.colDef.field]] === '1') {
+            style['backgroundColor'] = '#e0e0e0';  // Gray for cells with <=3 free hours
+        }
 
         return style;
-    }}
+    }
     """)
 
     # Enable editing and apply the cell style function
@@ -129,40 +193,27 @@ def show_assignation_boost():
         )
 
     # Highlight in green the next week column
-    highlight_column = compute_next_week_column(boost_assignation.set_index('Semana'), week_start_column='_Inicio')
+    highlight_column = compute_next_week_column(*horizon)
 
     # For the next week column, use a combined style that preserves both stylings
-    next_week_cell_style = JsCode(f"""
-    function(params) {{
-        // Free hours data from Python
-        const freeHoursData = {js_free_hours};
-
+    next_week_cell_style = JsCode("""
+    function(params) {
         // Default next week highlight style
-        let style = {{
+        let style = {
             'backgroundColor': '#e8f5e9',
             'color': '#1b5e20',
             'fontWeight': 'bold',
             'borderRight': '1px solid #ddd'
-        }};
-
-        // If it's not the Semana column and not in the first two rows
-        if (params.node.rowIndex > 1) {{
-            const colName = params.colDef.field;
-            const rowIdx = params.node.rowIndex;  // Adjust index to match free_hours DataFrame
+        };
 
-            // Check if we have data for this cell and free_hours <= 3
-            if (freeHoursData[colName] && freeHoursData[colName][rowIdx] !== undefined) {{
-                const freeHours = freeHoursData[colName][rowIdx];
-
-                // If free_hours <= 3, use a gray-green blend for the next week column
-                if (freeHours <= 3) {{
-                    style['backgroundColor'] = '#d4dbd4';  // Grayish-green for next week with <=3 free hours
-                }}
-            }}
-        }}
+        // If free_hours <= 3, use a gray-green blend for the next week column
+        const flags = params.context.lowFreeHours[params.data.Semana];
+        if (flags !== undefined && flags[params.context.weekColumns[params.colDef.field]] === '1') {
+            style['backgroundColor'] = '#d4dbd4';  // Grayish-green for next week with <=3 free hours
+        }
 
         return style;
-    }}
+    }
     """)
 
     gb.configure_column(
@@ -195,20 +246,21 @@ def show_assignation_boost():
             submitted = st.form_submit_button("Guardar cambios", use_container_width=True)
 
         # Add the AgGrid component
-        grid_response = AgGrid(
-            boost_assignation,
-            gridOptions=grid_options,
-            update_mode='MODEL_CHANGED',
-            fit_columns_on_grid_load=True,
-            height=650,
-            allow_unsafe_jscode=True,
-            reload_data=False,
-            key='aggrid'
-        )
-
-        # Get the updated data
+        with timer('render', 'AgGrid'):
+            grid_response = AgGrid(
+                boost_assignation,
+                gridOptions=grid_options,
+                update_mode='MODEL_CHANGED',
+                fit_columns_on_grid_load=True,
+                height=650,
+                allow_unsafe_jscode=True,
+                reload_data=False,
+                key='aggrid'
+            )
+
+        # Get the updated data. The grid keeps the session's edits, they aren't copied to the session state
         updated_data = grid_response['data']
-        st.session_state.edited_data = updated_data
 
+    st.session_state.boost_assignation_grid = boost_assignation
     if submitted:
-        save_changes()
\ No newline at end of file
+        save_changes(updated_data)
\ No newline at end of file
@@ -1,12 +1,19 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
-import calendar
 from unidecode import unidecode
 import plotly.graph_objects as go
-import plotly.express as px
 
+from utils.cache import derived
+from utils.charts import cached_figure, donut
+from utils.intervals import to_days, year_months
+from utils.planning import planning_year
+from utils.profiling import timer
+from utils.styling import css_frame, group_bands, styled
+from utils.work_calendar import load_fraction, member_rows
+from .holidays import work_calendar
 from .team import load_team_members
-from .projects import load_projects
+from .projects import overlapping_rows, read_projects
 
 
 MONTHS = [
@@ -15,64 +22,90 @@ MONTHS = [
 ]
 
 
-def compute_assignation_hours():
-    load_projects()
-    projects = st.session_state.projects_data
-
-    # How many days from each month are assigned to each project for each team member
-    assignation_days = projects.join(
-        projects.apply(lambda p: pd.Series(pd.date_range(p['Inicio'], p['Fin'], freq='D').to_period('M')), axis=1)
-        .apply(lambda x: pd.Series(x).value_counts(), axis=1)
-        .fillna(0)
-        .astype(int)
+def month_hours(projects, year, rows=None):
+    # Hours of each project assignment in each month of the year, next to its columns: the monthly hours times the
+    # fraction of the working days of the month the team member works on it (see utils.work_calendar). `rows` are the
+    # positions of the assignments that overlap the year, when known: the others have no hours in it
+    months = year_months(year)
+    if rows is None:
+        rows = np.arange(len(projects))
+    work_cal = work_calendar(f'{year}-01-01', f'{year}-12-31')
+
+    month_starts = months.astype('datetime64[D]')
+    month_ends = (months + 1).astype('datetime64[D]') - 1
+    fraction = np.zeros((len(projects), len(months)))
+    fraction[rows] = load_fraction(
+        work_cal, member_rows(work_cal, projects['Equipo'].iloc[rows])[:, None],
+        np.maximum(to_days(projects['Inicio'].iloc[rows])[:, None], month_starts),
+        np.minimum(to_days(projects['Fin'].iloc[rows])[:, None], month_ends),
+        np.arange(len(months))
     )
-    ## Rename columns to Spanish month names
-    assignation_days.columns = assignation_days.columns.astype(str)
-    month_mapping = {f'2025-{i + 1:02d}': month for i, month in enumerate(MONTHS)}
-    assignation_days.rename(columns=month_mapping, inplace=True)
-
-    # Convert to hours
-    assignation_hours = assignation_days.copy()
-    assignation_days['HorasMes'] = assignation_days['HorasMes'].astype(float)
-    days_in_month = {month: calendar.monthrange(2025, i + 1)[1] for i, month in enumerate(MONTHS)}
-    for month in MONTHS:
-        assignation_hours[month] = assignation_hours[month] / days_in_month[month] * assignation_days['HorasMes']
-    assignation_hours[MONTHS] = assignation_hours[MONTHS].fillna(0)
-    assignation_hours[MONTHS] = assignation_hours[MONTHS].astype(int)
 
-    columns_to_keep = ['Equipo', 'Proyecto'] + MONTHS
-    assignation_hours = assignation_hours[columns_to_keep]
+    # Convert to hours. Rounded before truncating, so whole months give exactly the monthly hours
+    hours_by_month = projects['HorasMes'].astype(float).to_numpy()[:, None]
+    assignation_hours = projects.copy()
+    assignation_hours[MONTHS] = np.round(np.nan_to_num(fraction * hours_by_month), 6).astype(int)
     return assignation_hours
 
-def show_assignation_projects():
-    load_team_members()
-    team_members = st.session_state.team_data  # TODO: ensure all team members are in this table. It could happen when they have no project assigned, as the list of team members is taken from projects.db
 
-    assignation_hours = compute_assignation_hours()
+@derived('projects', 'team_members', 'holidays')
+def monthly_assignation(year):
+    # Hours of each project assignment (every column of read_projects) in each month of the year
+    projects = read_projects()
+    return month_hours(projects, year, overlapping_rows(projects, f'{year}-01-01', f'{year}-12-31'))
+
+
+@monthly_assignation.incremental('projects')
+def _update_monthly_assignation(assignation, change, year):
+    # Only the saved rows are computed again. Rows keep the order of read_projects (by id)
+    before, after = change
+    assignation = assignation[~assignation['id'].isin(before['id'])]
+    if not after.empty:
+        assignation = pd.concat([assignation, month_hours(after, year)]).sort_values('id', kind='stable')
+    return assignation.reset_index(drop=True)
+
+
+def compute_assignation_hours(year):
+    columns_to_keep = ['Equipo', 'Proyecto'] + MONTHS
+    return monthly_assignation(year)[columns_to_keep]
+
+
+@derived('projects', 'team_members', 'holidays')
+def assignation_projects_table(year):
+    # Table of hours of each assignment, sorted by team member and project, and its CSS: the rows of each team member
+    # share a band
+    assignation_hours = compute_assignation_hours(year)
 
     assignation_hours['Equipo_sort'] = assignation_hours['Equipo'].apply(unidecode)
     assignation_hours = assignation_hours.sort_values(by=['Equipo_sort', 'Proyecto']).drop(columns=['Equipo_sort'])
 
-    # Style rows
-    def highlight_rows(row):
-        if row.name == 0:
-            highlight_rows.prev_equipo = row['Equipo']
-            return ['background-color: #f5f5f5' for _ in row]
-        elif row['Equipo'] != highlight_rows.prev_equipo:
-            highlight_rows.prev_equipo = row['Equipo']
-            highlight_rows.color = '#ffffff' if highlight_rows.color == '#f5f5f5' else '#f5f5f5'
-        return [f'background-color: {highlight_rows.color}' for _ in row]
-
-    highlight_rows.prev_equipo = None
-    highlight_rows.color = '#f5f5f5'
-    assignation_hours_styled = assignation_hours.style.apply(highlight_rows, axis=1)
-
-    st.dataframe(
-        assignation_hours_styled,
-        use_container_width=True,
-        height=600,
-        hide_index=True,
+    background = group_bands(assignation_hours['Equipo'], colors=('#f5f5f5', '#ffffff'))
+    return assignation_hours, css_frame(assignation_hours, background)
+
+
+def project_sizes_donut(project_hours):
+    fig = go.Figure(data=[donut(project_hours['Proyecto'], project_hours['TotalHoras'], 'Hours per Project')])
+    fig.update_layout(
+        title=dict(text='Tamaño de los proyectos', font=dict(size=24)),
+        margin=dict(t=100, b=200, l=0, r=0),
+        height=750,
     )
+    return fig
+
+
+def show_assignation_projects():
+    load_team_members()
+    team_members = st.session_state.team_data  # TODO: ensure all team members are in this table. It could happen when they have no project assigned, as the list of team members is taken from projects.db
+
+    assignation_hours, css = assignation_projects_table(planning_year())
+
+    with timer('render', 'Asignación a proyectos'):
+        st.dataframe(
+            styled(assignation_hours, css),
+            use_container_width=True,
+            height=600,
+            hide_index=True,
+        )
 
     # Chart: pie by project with plotly
 
@@ -82,17 +115,5 @@ def show_assignation_projects():
     project_hours.columns = ['Proyecto', 'TotalHoras']
 
     with col1:
-        fig = go.Figure(data=[go.Pie(
-            labels=project_hours['Proyecto'],
-            values=project_hours['TotalHoras'],
-            title='Hours per Project',
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4,
-        )])
-        fig.update_layout(
-            title=dict(text='Tamaño de los proyectos', font=dict(size=24)),
-            margin=dict(t=100, b=200, l=0, r=0),
-            height=750,
-        )
+        fig = cached_figure(project_sizes_donut, project_hours)
         st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
@@ -1,6 +1,10 @@
 import streamlit as st
 from unidecode import unidecode
 
+from utils.cache import derived
+from utils.planning import planning_year
+from utils.profiling import timer
+from utils.styling import css_frame, row_bands, styled
 from .assignation_projects import compute_assignation_hours
 
 
@@ -10,26 +14,31 @@ MONTHS = [
 ]
 
 
-def compute_assingation_hours_total():
-    assignation_hours = compute_assignation_hours()
+@derived('projects', 'team_members', 'holidays')
+def compute_assingation_hours_total(year):
+    assignation_hours = compute_assignation_hours(year)
 
     assignation_hours_total = assignation_hours.groupby('Equipo').sum().reset_index().drop(columns=['Proyecto'])
     assignation_hours_total['Equipo_sort'] = assignation_hours_total['Equipo'].apply(unidecode)
     assignation_hours_total = assignation_hours_total.sort_values(by=['Equipo_sort']).reset_index().drop(columns=['Equipo_sort', 'index'])
     return assignation_hours_total
 
-def show_assignation_total():
 
-    assignation_hours_total = compute_assingation_hours_total()
+@derived('projects', 'team_members', 'holidays')
+def assignation_total_table(year):
+    # Table of hours assigned to each team member and its CSS (banded rows)
+    assignation_hours_total = compute_assingation_hours_total(year)
+    return assignation_hours_total, css_frame(assignation_hours_total, row_bands(len(assignation_hours_total)))
+
+
+def show_assignation_total():
 
-    # Style the table
-    def highlight_rows(row):
-        return ['background-color: #ffffff' if row.name % 2 == 0 else 'background-color: #f5f5f5' for _ in row]
-    assignation_hours_total_styled = assignation_hours_total.style.apply(highlight_rows, axis=1)
+    assignation_hours_total, css = assignation_total_table(planning_year())
 
-    st.dataframe(
-        assignation_hours_total_styled,
-        use_container_width=True,
-        height=600,
-        hide_index=True,
-    )
+    with timer('render', 'Asignación total'):
+        st.dataframe(
+            styled(assignation_hours_total, css),
+            use_container_width=True,
+            height=600,
+            hide_index=True,
+        )
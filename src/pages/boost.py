@@ -2,152 +2,175 @@ import pandas as pd
 import numpy as np
 import calendar
 import streamlit as st
-from datetime import datetime, timedelta
-
-from .team import load_team_members
-from .projects import load_projects
+from datetime import datetime
+
+from utils.calendar_dimension import build_calendar_range, year_calendar
+from utils.intervals import to_days
+from utils.cache import derived
+from utils.planning import horizon_bounds
+from utils.profiling import timer
+from utils.styling import css_frame, numeric_values, row_bands, styled
+from utils.work_calendar import load_fraction, member_rows
+from .team import read_team_members
+from .projects import overlapping_rows, read_projects
 from .assignation_total import compute_assingation_hours_total
+from .holidays import work_calendar
 
-YEAR = 2025
 MONTHS = [
     'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
     'Julio', 'Agosto', 'Setiembre', 'Octubre', 'Noviembre', 'Diciembre'
 ]
 
 
+def month_labels(months):
+    # Spanish names of the months (datetime64[M]), with their year when they span more than one
+    names = [MONTHS[month.astype(object).month - 1] for month in months]
+    if len(set(months.astype('datetime64[Y]'))) > 1:
+        names = [f'{name} {month.astype(object).year}' for name, month in zip(names, months)]
+    return names
+
+
+def calendar_weeks(calendar_dim):
+    # Weeks of the calendar dimension, labelled with their ISO week number: Monday, Sunday and how many business days
+    # of each month they have
+    weeks = pd.DataFrame({
+        'index': calendar_dim.iso_weeks,
+        'Monday': calendar_dim.week_starts.astype(str),
+        'Sunday': calendar_dim.week_ends.astype(str),
+        **{
+            month: calendar_dim.week_month_business_days[:, i]
+            for i, month in enumerate(month_labels(calendar_dim.months))
+        },
+    })
+    return weeks.set_index('index').T
+
+
 def generate_weeks(year):
-    # Start from the first Monday of the year or the last Monday of the previous year
-    start_date = datetime(year, 1, 1)
-    if start_date.weekday() != 0:
-        start_date -= timedelta(days=start_date.weekday())
-
-    weeks = []
-    week_number = 1
-    while start_date.year == year or (start_date + timedelta(days=6)).year == year:
-        end_date = start_date + timedelta(days=6)
-
-        # How many days of this week belong to each month
-        date_range = pd.date_range(start=start_date, end=end_date, freq='D')  # Date range for the current week
-        # date_range = date_range[date_range.year == year]  # Filter dates to this year
-        date_range = date_range[(date_range.year == year) & (date_range.weekday < 5)]  # Filter dates to this year and weekdays
-        days_in_month = date_range.to_series().dt.month.value_counts().sort_index()
-        days_in_month = {month: days_in_month.get(month, 0) for month in range(1, 13)}
-
-        weeks.append({
-            'index': week_number,
-            'Monday': start_date.strftime('%Y-%m-%d'),
-            'Sunday': end_date.strftime('%Y-%m-%d'),
-            **{f'{MONTHS[month - 1]}': days for month, days in days_in_month.items()},
-        })
-        start_date += timedelta(days=7)
-        week_number += 1
-
-    return pd.DataFrame(weeks).set_index('index').T
-
-
-def get_month(week_start, week_end):
-    month = week_start.month
-    if week_start.year != YEAR:
-        month = week_end.month
-    return month
-
-def compute_month_business_days(month):
-    return len(pd.date_range(
-        start=pd.Timestamp(year=YEAR, month=month, day=1),
-        end=pd.Timestamp(year=YEAR, month=month, day=calendar.monthrange(YEAR, month)[1]),
-        freq='B'
-    ))
-
-def distribute_hours(project_start_date, project_end_date, hours_by_month, week_start, week_end):
-    year_start = datetime(YEAR, 1, 1)
-    year_end = datetime(YEAR, 12, 31)
-
-    # Working days in the project in the month of the week
-    month_business_days = compute_month_business_days(get_month(week_start, week_end))
-
-    # Business days in the current week
-    # week_days = pd.date_range(start=max(week_start, project_start_date), end=min(week_end, project_end_date), freq='B')
-    week_days = pd.date_range(
-        start=max(week_start, project_start_date, year_start),
-        end=min(week_end, project_end_date, year_end),
-        freq='B'
-    )
-    week_business_days = len(week_days)
-
-    # Calculate hours for this week
-    exact_hours_by_month = float(hours_by_month) * month_business_days / 20
-    try:
-        hours_this_week = exact_hours_by_month * week_business_days / month_business_days
-    except ZeroDivisionError:
-        hours_this_week = 0
-
-    return hours_this_week
-
-def compute_weekly_assignation(team_members, projects):
-    # Team members
-    load_team_members()
-    team_members = st.session_state.team_data
+    # Weeks of the year, numbered from 1
+    calendar_dim = year_calendar(year)
+    weeks = calendar_weeks(calendar_dim)
+    weeks.columns = pd.Index(calendar_dim.week_numbers, name=weeks.columns.name)
+    return weeks
+
+
+def week_month_windows(calendar_dim):
+    # Each week of the calendar dimension split at the end of a month: for its part in the month it belongs to and its
+    # part in the next one (empty when it doesn't reach it), the index of the month and the first and last day,
+    # within the range
+    first = np.maximum(calendar_dim.week_starts, calendar_dim.start)
+    last = np.minimum(calendar_dim.week_ends, calendar_dim.end)
+    next_month = (calendar_dim.months[calendar_dim.week_months] + 1).astype('datetime64[D]')
+    next_month_idx = np.minimum(calendar_dim.week_months + 1, len(calendar_dim.months) - 1)
+    return [
+        (calendar_dim.week_months, first, np.minimum(last, next_month - 1)),
+        (next_month_idx, np.maximum(first, next_month), last),
+    ]
+
+
+def weekly_hours(projects, calendar_dim, work_cal):
+    # Hours of each project assignment in each week of the calendar dimension, within it (projects x weeks): the
+    # monthly hours are spread over the working days of the month, and done in the working days of the team member
+    # (see utils.work_calendar). Missing hours count 0
+    rows = member_rows(work_cal, projects['Equipo'])[:, None]
+    starts = to_days(projects['Inicio'])[:, None]
+    ends = to_days(projects['Fin'])[:, None]
+
+    fraction = np.zeros((len(projects), len(calendar_dim.week_starts)))
+    for months, first, last in week_month_windows(calendar_dim):
+        fraction += load_fraction(work_cal, rows, np.maximum(starts, first), np.minimum(ends, last), months)
+
+    hours_by_month = np.nan_to_num(projects['HorasMes'].astype(float).to_numpy())[:, None]
+    return hours_by_month * fraction
+
+
+@derived('projects', 'team_members', 'holidays')
+def compute_weekly_assignation(start, end):
+    # Hours assigned to each team member in each week from start to end (see utils.planning.horizon_bounds)
+    team_members = read_team_members()
     team_members_names = team_members['Nombre'].tolist()
 
-    # Load projects
-    load_projects()
-    projects = st.session_state.projects_data
+    calendar_dim = build_calendar_range(start, end)
+    weeks = calendar_weeks(calendar_dim)
+
+    # Projects that overlap the horizon, the others have no hours in it
+    projects = read_projects()
+    projects = projects.iloc[overlapping_rows(projects, calendar_dim.start, calendar_dim.end)]
+    hours = weekly_hours(projects, calendar_dim, work_calendar(start, end))
 
-    weeks = generate_weeks(YEAR)
+    # Sum the projects of each team member
+    member_idx = pd.Index(team_members_names).get_indexer(projects['Equipo'])
+    member_hours = np.zeros((len(team_members_names), len(weeks.columns)))
+    np.add.at(member_hours, member_idx[member_idx >= 0], hours[member_idx >= 0])
 
     assignation = pd.concat([
         weeks.loc[['Monday', 'Sunday']],
-        pd.DataFrame(0, index=team_members_names, columns=weeks.columns)
+        pd.DataFrame(member_hours, index=team_members_names, columns=weeks.columns)
     ])
 
-    for week_idx, week in weeks.T.iterrows():
-        week_start = pd.to_datetime(week['Monday'])
-        week_end = pd.to_datetime(week['Sunday'])
+    return weeks, assignation
+
+
+def changed_members(members, change):
+    # Positions in `members` of the team members of the rows of a projects change (see projects._update_projects)
+    before, after = change
+    positions = pd.Index(members).get_indexer(pd.concat([before['Equipo'], after['Equipo']]).unique())
+    return positions[positions >= 0]
+
 
-        for _, project in projects.iterrows():
-            team_member = project['Equipo']
+@compute_weekly_assignation.incremental('projects')
+def _update_weekly_assignation(value, change, start, end):
+    # The hours of the rows before the save are subtracted and the ones after it added, in the rows of their team
+    # members only
+    weeks, assignation = value
+    before, after = change
+    calendar_dim = build_calendar_range(start, end)
+    work_cal = work_calendar(start, end)
+    members = assignation.index[2:]
+    positions = changed_members(members, change)
 
-            if (project['Fin'] >= week_start) and (project['Inicio'] <= week_end):
-                hours = distribute_hours(
-                    project['Inicio'], project['Fin'],
-                    project['HorasMes'], week_start, week_end
-                )
-                assignation.loc[team_member, week_idx] += hours
+    member_hours = np.array(assignation.iloc[2 + positions], dtype=float)
+    for rows, sign in ((before, -1), (after, 1)):
+        member_idx = pd.Index(members[positions]).get_indexer(rows['Equipo'])
+        np.add.at(member_hours, member_idx[member_idx >= 0], sign * weekly_hours(rows, calendar_dim, work_cal)[member_idx >= 0])
+    assignation.iloc[2 + positions] = member_hours
 
     return weeks, assignation
 
-def compute_weekly_free_hours():
-    load_team_members()
-    team_members = st.session_state.team_data
-    team_members_names = team_members['Nombre'].tolist()
 
-    load_projects()
-    projects = st.session_state.projects_data
+@derived('team_members', 'holidays')
+def compute_weekly_available_hours(start, end):
+    # Hours each team member can work in each week from start to end (members x weeks, in the order of
+    # read_team_members): the monthly capacity, from the column of the month's name, spread over the working days of
+    # the month and counted in the working days of the member, the same way as the assigned hours
+    team_members = read_team_members()
+    calendar_dim = build_calendar_range(start, end)
+    work_cal = work_calendar(start, end)
+    rows = member_rows(work_cal, team_members['Nombre'])[:, None]
 
-    weeks, assignation = compute_weekly_assignation(team_members, projects)
+    month_numbers = calendar_dim.months.astype(int) % 12
+    capacity = np.nan_to_num(team_members[MONTHS].astype(float).to_numpy())[:, month_numbers]
 
-    free_hours = assignation.copy()
-    free_hours.loc[team_members_names] = 0
+    available_hours = np.zeros((len(team_members), len(calendar_dim.week_starts)))
+    for months, first, last in week_month_windows(calendar_dim):
+        available_hours += capacity[:, months] * load_fraction(work_cal, rows, first, last, months)
+    return available_hours
 
-    for team_member in team_members_names:
-        for week in assignation.columns:
-            week_start = pd.to_datetime(weeks[week]['Monday'])
-            week_end = pd.to_datetime(weeks[week]['Sunday'])
 
-            month = get_month(week_start, week_end)
-            month_hours_available = team_members.loc[team_members['Nombre'] == team_member, MONTHS[month - 1]].item()
+def free_hours_values(available_hours, assigned_hours):
+    # Whole free hours. Rounded before truncating, so sums that only differ in floating point error (e.g. maintained
+    # incrementally) give the same hours
+    return np.round(available_hours - assigned_hours, 6).astype(int)
 
-            # available_hours = distribute_hours(
-            #     pd.Timestamp(year=YEAR, month=month, day=1),
-            #     pd.Timestamp(year=YEAR, month=month, day=calendar.monthrange(YEAR, month)[1]),
-            #     month_hours_available, week_start, week_end
-            # )
-            available_hours = distribute_hours(week_start, week_end, month_hours_available, week_start, week_end)
 
-            free_hours.loc[team_member, week] = available_hours - assignation.loc[team_member, week]
+@derived('projects', 'team_members', 'holidays')
+def compute_weekly_free_hours(start, end):
+    weeks, assignation = compute_weekly_assignation(start, end)
 
+    available_hours = compute_weekly_available_hours(start, end)
+    assigned_hours = assignation.iloc[2:].to_numpy(dtype=float)
 
-    free_hours.loc[team_members_names] = free_hours.loc[team_members_names].round().astype(int)
+    free_hours = assignation.copy()
+    free_hours.iloc[2:] = free_hours_values(available_hours, assigned_hours)
     free_hours.loc['Inicio'] = free_hours.loc['Monday'].apply(lambda x: pd.to_datetime(x).strftime('%d/%m'))
     free_hours.loc['Fin'] = free_hours.loc['Sunday'].apply(lambda x: pd.to_datetime(x).strftime('%d/%m'))
     free_hours.drop(['Monday', 'Sunday'], inplace=True)
@@ -161,6 +184,20 @@ def compute_weekly_free_hours():
 
     return weeks, free_hours
 
+
+@compute_weekly_free_hours.incremental('projects')
+def _update_weekly_free_hours(value, change, start, end):
+    # Free hours of the team members of the change, from their hours already updated in compute_weekly_assignation
+    weeks, free_hours = value
+    _, assignation = compute_weekly_assignation(start, end)
+    positions = changed_members(free_hours['Semana'].iloc[2:], change)
+
+    available_hours = compute_weekly_available_hours(start, end)[positions]
+    assigned_hours = assignation.iloc[2 + positions].to_numpy(dtype=float)
+    free_hours.iloc[2 + positions, 1:] = free_hours_values(available_hours, assigned_hours)
+
+    return weeks, free_hours
+
 # def compute_workable_days(month):
 #     # Calculate the total workable days (excluding Saturdays and Sundays) in the current month
 #     month_index = MONTHS.index(month) + 1
@@ -214,64 +251,41 @@ def compute_weekly_free_hours():
 #     return weeks, assignation_weeks
 
 
-def compute_next_week_column(weeks, week_start_column='Monday'):
-    today = datetime.today()
-    next_week_col = None
-    for week in weeks.columns:
-        if pd.to_datetime(weeks.loc[week_start_column, week]) > today:
-            next_week_col = str(week)
-            break
-    return next_week_col
+def compute_next_week_column(start, end):
+    # Label of the first week of the horizon starting after today
+    calendar_dim = build_calendar_range(start, end)
+    next_week = np.searchsorted(calendar_dim.week_starts, np.datetime64(datetime.today().date()), side='right')
+    return str(calendar_dim.iso_weeks[next_week]) if next_week < len(calendar_dim.week_starts) else None
 
 
-def show_boost():
-
-    weeks, assignation_weeks = compute_weekly_free_hours()
+@derived('projects', 'team_members', 'holidays')
+def weekly_free_hours_table(start, end, next_week_col):
+    # Table of the Boost tab and its CSS: banded rows, the Inicio/Fin header rows, the next week column and free
+    # hours above 3 in red
+    weeks, assignation_weeks = compute_weekly_free_hours(start, end)
 
     # Ensure all columns are strings
     for col in assignation_weeks.columns:
         if assignation_weeks[col].dtype == 'object':
             assignation_weeks[col] = assignation_weeks[col].astype(str)
 
-    # Style the table
-    # ------------------------------------------------------------------------------------------------------------------
-    def highlight_alternating_rows(row):
-        return ['background-color: #ffffff' if row.name % 2 == 0 else 'background-color: #f5f5f5' for _ in row]
-
-    def highlight_first_two_rows(row):
-        if row.name < 2:
-            return ['background-color: #dddddd'] * len(row)
-        else:
-            return [''] * len(row)
-
-
-    next_week_col = compute_next_week_column(weeks)
-    def highlight_next_week(col):
-        if col.name == next_week_col:
-            return ['background-color: #e8f5e9'] * len(col)
-        else:
-            return [''] * len(col)
-
-    def highlight_greater_than_three(val):
-        try:
-            int_val = int(val)
-            if int_val > 3:
-                return 'color: #CF0515'
-            return ''
-        except ValueError:
-            return ''
-
-    assignation_weeks_styled = (
-        assignation_weeks.style
-        .apply(highlight_alternating_rows, axis=1)
-        .apply(highlight_next_week, axis=0)
-        .apply(highlight_first_two_rows, axis=1)
-        .map(highlight_greater_than_three)
-    )
-
-    st.dataframe(
-        assignation_weeks_styled,
-        use_container_width=True,
-        height=750,
-        hide_index=True,
-    )
+    background = np.broadcast_to(row_bands(len(assignation_weeks)), assignation_weeks.shape)
+    background = np.where(assignation_weeks.columns == next_week_col, '#e8f5e9', background)
+    background[:2] = '#dddddd'
+    color = np.where(numeric_values(assignation_weeks) > 3, '#CF0515', '')
+
+    return assignation_weeks, css_frame(assignation_weeks, background, color)
+
+
+def show_boost():
+
+    horizon = horizon_bounds()
+    assignation_weeks, css = weekly_free_hours_table(*horizon, compute_next_week_column(*horizon))
+
+    with timer('render', 'Boost'):
+        st.dataframe(
+            styled(assignation_weeks, css),
+            use_container_width=True,
+            height=750,
+            hide_index=True,
+        )
@@ -0,0 +1,82 @@
+import pandas as pd
+import streamlit as st
+
+from utils.profiling import CATEGORIES, LOG_PATH, recent_runs, slow_queries
+
+
+def runs_table(runs):
+    # One row per rerun, most recent first: total and time of each category, in milliseconds
+    rows = [
+        {
+            'Hora': run['time'],
+            'Página': run['page'],
+            'Total (ms)': run['total'] * 1000,
+            **{f'{category} (ms)': run['breakdown'].get(category, 0.0) * 1000 for category in CATEGORIES},
+        }
+        for run in reversed(runs)
+    ]
+    return pd.DataFrame(rows)
+
+
+def timings_table(run):
+    timings = pd.DataFrame(run['timings'])
+    if timings.empty:
+        return timings
+    timings = timings.sort_values('offset')
+    timings['name'] = ['    ' * depth + name for depth, name in zip(timings['depth'], timings['name'])]
+    timings['duration'] *= 1000
+    timings['self'] *= 1000
+    return timings[['category', 'name', 'duration', 'self']].rename(columns={
+        'category': 'Categoría', 'name': 'Nombre', 'duration': 'Duración (ms)', 'self': 'Propio (ms)'
+    })
+
+
+def functions_table(runs):
+    # Time of each compute function and query over the recent reruns
+    timings = pd.DataFrame([timing for run in runs for timing in run['timings']])
+    if timings.empty:
+        return timings
+    timings = timings[timings['category'] != 'page']
+    summary = timings.groupby(['category', 'name'])['duration'].agg(['count', 'sum', 'mean', 'max']).reset_index()
+    summary[['sum', 'mean', 'max']] *= 1000
+    summary = summary.sort_values('sum', ascending=False)
+    return summary.rename(columns={
+        'category': 'Categoría', 'name': 'Nombre', 'count': 'Llamadas', 'sum': 'Total (ms)', 'mean': 'Media (ms)',
+        'max': 'Máximo (ms)'
+    })
+
+
+def show_diagnostics():
+    runs = [run for run in recent_runs() if run['page'] != 'Diagnóstico']
+    st.caption(f"Últimas {len(runs)} ejecuciones de páginas. Registro completo en {LOG_PATH}")
+
+    if not runs:
+        st.info("Todavía no hay ejecuciones registradas.")
+        return
+
+    st.subheader("Ejecuciones")
+    st.dataframe(runs_table(runs), use_container_width=True, hide_index=True, height=300)
+
+    st.subheader("Detalle")
+    options = list(range(len(runs) - 1, -1, -1))
+    selected = st.selectbox(
+        "Ejecución", options, format_func=lambda i: f"{runs[i]['time']}  {runs[i]['page']}  "
+                                                    f"{runs[i]['total'] * 1000:.0f} ms"
+    )
+    st.dataframe(timings_table(runs[selected]), use_container_width=True, hide_index=True, height=400)
+
+    st.subheader("Consultas lentas")
+    queries = pd.DataFrame(slow_queries()[::-1])
+    if queries.empty:
+        st.write("Ninguna.")
+    else:
+        queries['duration'] *= 1000
+        st.dataframe(
+            queries.rename(columns={
+                'time': 'Hora', 'page': 'Página', 'statement': 'Consulta', 'duration': 'Duración (ms)'
+            }),
+            use_container_width=True, hide_index=True
+        )
+
+    st.subheader("Funciones y consultas")
+    st.dataframe(functions_table(runs), use_container_width=True, hide_index=True, height=400)
@@ -1,30 +1,107 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
+import concurrent.futures
 import datetime
+import functools
+import json
+import logging
 import os.path
+import threading
+import time
+import httplib2
 from unidecode import unidecode
+from google.auth.credentials import AnonymousCredentials
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from sqlalchemy import text
+
+from utils.cache import bump_revision, derived
+from utils.planning import planning_year
+from utils.intervals import month_overlap_days, to_days, year_months
+from utils.profiling import timed, timer
+from utils.styling import css_frame, row_bands, styled
+from utils.storage import engine
+from utils.work_calendar import build_work_calendar
+from .team import read_team_members
 
 CALENDAR_ID = "hunf5b8n0rpad4o898t54h5trl69l66r@import.calendar.google.com"
+# Leave calendars (e.g. one per office), comma separated. Their events are the leave of the team member they are named
+# after
+LEAVE_CALENDAR_IDS = tuple(os.environ.get('PLANNING_LEAVE_CALENDARS', CALENDAR_ID).split(','))
+# Public calendar of the national holidays, synced like the leave calendar. They are off for every team member
+NATIONAL_CALENDAR_ID = os.environ.get('PLANNING_NATIONAL_CALENDAR', "es.uy#holiday@group.v.calendar.google.com")
+# Calendars of the working days of the capacity engines (see work_calendar)
+WORK_CALENDAR_IDS = (*LEAVE_CALENDAR_IDS, NATIONAL_CALENDAR_ID)
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 MONTHS = [
     'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
     'Julio', 'Agosto', 'Setiembre', 'Octubre', 'Noviembre', 'Diciembre'
 ]
 
-def show_holidays():
-    creds = None
+# The calendar events are kept in the holidays table, refreshed incrementally with the Calendar API sync tokens
+SYNC_INTERVAL = datetime.timedelta(minutes=15)  # The calendar is only asked for changes when the cache is older
+SYNC_TIMEOUT = float(os.environ.get('PLANNING_CALENDAR_TIMEOUT', 10))  # Seconds a page waits for the calendars
+REQUEST_TIMEOUT = 30  # Seconds of each request to the Calendar API
+SYNC_WORKERS = 8
+SYNC_CHECK_INTERVAL = 60  # Seconds between the checks of sync_work_calendars, per process
+# Another server with the events.list endpoint of the Calendar API (e.g. benchmarks/fake_calendar.py), asked without
+# credentials
+CALENDAR_ENDPOINT = os.environ.get('PLANNING_CALENDAR_ENDPOINT')
+
+UPSERT_EVENT = text("""
+    INSERT OR REPLACE INTO holidays (id, calendar_id, name, start, "end", status)
+    VALUES (:id, :calendar_id, :name, :start, :end, :status)
+""")
+DELETE_EVENT = text("DELETE FROM holidays WHERE calendar_id = :calendar_id AND id = :id")
+SEEN_EVENT = text("INSERT OR IGNORE INTO temp.synced_events (id) VALUES (:id)")
+DELETE_UNSEEN_EVENTS = text(
+    "DELETE FROM holidays WHERE calendar_id = :calendar_id AND id NOT IN (SELECT id FROM temp.synced_events)"
+)
+SAVE_SYNC = text("""
+    INSERT OR REPLACE INTO holidays_sync (calendar_id, sync_token, synced_at)
+    VALUES (:calendar_id, :sync_token, :synced_at)
+""")
+
+
+class SyncTokenExpired(Exception):
+    # The server no longer accepts the sync token (HTTP 410). A full sync is needed
+    pass
+
+
+class NoCredentials(Exception):
+    # No valid (or refreshable) token.json, and the sync can't ask the user to log in
+    pass
+
+
+def load_token():
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first time.
     if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        return Credentials.from_authorized_user_file('token.json', SCOPES)
+    return None
+
+
+def has_credentials():
+    # Whether the calendars can be synced without the authorization flow
+    if CALENDAR_ENDPOINT:
+        return True
+    creds = load_token()
+    return bool(creds and (creds.valid or (creds.expired and creds.refresh_token)))
+
+
+def get_credentials(interactive=True):
+    creds = load_token()
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
+        elif not interactive:
+            raise NoCredentials("no valid credentials in token.json, open Licencias to log in")
         else:
             flow = InstalledAppFlow.from_client_secrets_file(
                 'credentials.json', SCOPES)
@@ -32,95 +109,300 @@ def show_holidays():
         # Save the credentials for the next run
         with open('token.json', 'w') as token:
             token.write(creds.to_json())
+    return creds
 
 
-    service = build('calendar', 'v3', credentials=creds)
-
-    events_result = service.events().list(
-        calendarId=CALENDAR_ID,  # 'primary',
-        timeMin='2025-01-01T00:00:00Z',
-        timeMax='2025-12-31T23:59:59Z',
-        maxResults=1000,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    events = events_result.get('items', [])
-
-    # Create dataframe with events
-    events_data = []
-    for event in events:
-        name = event.get('summary')
-        start = event['start'].get('dateTime', event['start'].get('date'))
-        end = event['end'].get('dateTime', event['end'].get('date'))
-        status = event.get('status')
-        events_data.append({'name': name, 'start': start, 'end': end, 'status': status})
-
-    # Create a DataFrame with all holidays
-    df = pd.DataFrame(events_data, columns=['name', 'start', 'end', 'status'])
-    df = df.sort_values(by='name')
-    df['name_sort'] = df['name'].apply(unidecode)
-    df = df.sort_values(by=['name_sort']).drop(columns=['name_sort'])
-
-    # _, col1, _ = st.columns([2, 3, 2])
-    # with col1:
-    #     st.dataframe(
-    #         df,
-    #         use_container_width=True,
-    #         height=750,
-    #         hide_index=True,
-    #     )
-
-    # How many days from each month are holidays
-    holidays = df.join(
-        df.apply(lambda p: pd.Series(pd.date_range(p['start'], p['end'], freq='D').to_period('M')), axis=1)
-        .apply(lambda x: pd.Series(x).value_counts() - 1, axis=1)
-        .fillna(0)
-        .astype(int)
+_credentials_lock = threading.Lock()
+_services = threading.local()
+
+
+def get_calendar_service(interactive=True):
+    # Built once per thread: its HTTP client isn't thread-safe, and building it on every sync would be slow
+    service = getattr(_services, 'service', None)
+    if service is None:
+        if CALENDAR_ENDPOINT:
+            credentials, client_options = AnonymousCredentials(), {'api_endpoint': CALENDAR_ENDPOINT}
+        else:
+            with _credentials_lock:  # One authorization flow, one writer of token.json
+                credentials, client_options = get_credentials(interactive), None
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=REQUEST_TIMEOUT))
+        service = _services.service = build('calendar', 'v3', http=http, client_options=client_options)
+    return service
+
+
+@timed('calendar')
+def fetch_google_events_page(calendar_id, sync_token=None, page_token=None, interactive=True):
+    # One page of events.list. Without a sync token it is a full sync, otherwise only the changes since that token.
+    # Any callable with this signature and response format can replace it (e.g. a local fake in tests). Without
+    # `interactive`, missing credentials raise NoCredentials instead of starting the authorization flow
+    params = dict(calendarId=calendar_id, singleEvents=True, maxResults=1000, pageToken=page_token)
+    if sync_token:
+        params['syncToken'] = sync_token
+    try:
+        return get_calendar_service(interactive).events().list(**params).execute()
+    except HttpError as e:
+        if e.resp.status == 410:
+            raise SyncTokenExpired() from e
+        raise
+
+
+def iter_events_pages(fetch_page, calendar_id, sync_token):
+    # Follow nextPageToken until the last page, which carries the nextSyncToken
+    page_token = None
+    while True:
+        page = fetch_page(calendar_id, sync_token=sync_token, page_token=page_token)
+        yield page
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            break
+
+
+def parse_events(items, calendar_id):
+    # Rows of the holidays table of a page of events, a column at a time: start and end are the date of all-day
+    # events and the dateTime of the others (see event_days). Cancelled events only carry their id
+    starts = [event.get('start', {}) for event in items]
+    ends = [event.get('end', {}) for event in items]
+    return pd.DataFrame({
+        'id': [event['id'] for event in items],
+        'calendar_id': calendar_id,
+        'name': [event.get('summary') for event in items],
+        'start': [start.get('dateTime', start.get('date')) for start in starts],
+        'end': [end.get('dateTime', end.get('date')) for end in ends],
+        'status': [event.get('status') for event in items],
+    }, dtype=object)
+
+
+def iter_events(fetch_page, calendar_id, sync_token):
+    # The events of the calendar, a page at a time, and the sync token of the page (only the last one has it)
+    for page in iter_events_pages(fetch_page, calendar_id, sync_token):
+        yield parse_events(page.get('items', []), calendar_id), page.get('nextSyncToken')
+
+
+def store_events(pages, calendar_id, full_sync, synced_at):
+    # Write the pages as they arrive, each in its own short transaction: only one page is in memory and the store
+    # isn't locked while the next one is fetched. A full sync replaces the events of the calendar at the end, deleting
+    # the ones it didn't see (their ids are kept in a temporary table), so an interrupted sync never leaves the
+    # calendar half empty. The sync token is saved last: after an interruption, the pages are fetched again
+    sync_token = None
+    written = False
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("CREATE TEMP TABLE IF NOT EXISTS synced_events (id TEXT PRIMARY KEY)"))
+            connection.execute(text("DELETE FROM temp.synced_events"))
+            connection.commit()
+
+            for events, sync_token in pages:
+                cancelled = (events['status'] == 'cancelled').to_numpy()
+                if cancelled.any():
+                    connection.execute(DELETE_EVENT, events.loc[cancelled, ['calendar_id', 'id']].to_dict('records'))
+                if not cancelled.all():
+                    confirmed = events[~cancelled]
+                    connection.execute(UPSERT_EVENT, confirmed.to_dict('records'))
+                    if full_sync:
+                        connection.execute(SEEN_EVENT, confirmed[['id']].to_dict('records'))
+                connection.commit()
+                written = written or not events.empty
+
+            if full_sync:
+                connection.execute(DELETE_UNSEEN_EVENTS, {'calendar_id': calendar_id})
+            connection.execute(
+                SAVE_SYNC, {'calendar_id': calendar_id, 'sync_token': sync_token, 'synced_at': synced_at}
+            )
+            connection.execute(text("DELETE FROM temp.synced_events"))
+            connection.commit()
+            written = True
+    finally:
+        # Also when it failed after writing some pages
+        if written:
+            bump_revision('holidays')
+
+
+def sync_holidays(fetch_page=fetch_google_events_page, calendar_id=CALENDAR_ID, max_age=SYNC_INTERVAL):
+    with engine.connect() as connection:
+        sync = connection.execute(
+            text("SELECT sync_token, synced_at FROM holidays_sync WHERE calendar_id = :calendar_id"),
+            {'calendar_id': calendar_id}
+        ).first()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if sync is not None and now - datetime.datetime.fromisoformat(sync.synced_at) < max_age:
+        return
+
+    sync_token = sync.sync_token if sync is not None else None
+    try:
+        store_events(iter_events(fetch_page, calendar_id, sync_token), calendar_id, sync_token is None, now.isoformat())
+    except SyncTokenExpired:
+        store_events(iter_events(fetch_page, calendar_id, None), calendar_id, True, now.isoformat())
+
+
+# Running sync of each calendar. The pool is shared by the reruns of every session
+_syncs = {}
+_syncs_lock = threading.Lock()
+_sync_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix='calendar-sync')
+
+
+def sync_calendars(calendar_ids, fetch_page=fetch_google_events_page, max_age=SYNC_INTERVAL, timeout=SYNC_TIMEOUT):
+    # Sync the calendars concurrently, so it takes as long as the slowest one instead of the sum of all. Each one is
+    # stored as its pages arrive, independently of the others: the ones that fail don't hold back the rest, and the
+    # ones still syncing after `timeout` seconds go on in the background (a calendar never has two syncs running).
+    # Returns the exception of each calendar that failed or didn't finish in time
+    with _syncs_lock:
+        futures = {}
+        for calendar_id in dict.fromkeys(calendar_ids):
+            future = _syncs.get(calendar_id)
+            if future is None or future.done():
+                future = _syncs[calendar_id] = _sync_executor.submit(sync_holidays, fetch_page, calendar_id, max_age)
+            futures[calendar_id] = future
+
+    with timer('calendar', 'sync_calendars'):
+        done, _ = concurrent.futures.wait(futures.values(), timeout=timeout)
+
+    errors = {}
+    for calendar_id, future in futures.items():
+        if future not in done:
+            errors[calendar_id] = TimeoutError(f"still syncing after {timeout:g} s")
+        elif future.exception() is not None:
+            errors[calendar_id] = future.exception()
+    return errors
+
+
+_work_calendars_checked = None  # time.monotonic() of the last check of sync_work_calendars
+_work_calendars_skipped = None  # Why the last check didn't sync, if it didn't
+# The syncs in the background never start the authorization flow: it opens a browser on the server and waits for the
+# user, in a worker thread of whatever rerun or request came first
+fetch_work_calendar_page = functools.partial(fetch_google_events_page, interactive=False)
+
+
+def sync_work_calendars():
+    # Keep the calendars of the capacity engines synced, whatever page is open: called at the start of each rerun (and
+    # of each API request), it starts the syncs of the calendars older than SYNC_INTERVAL, at most once every
+    # SYNC_CHECK_INTERVAL seconds. It only waits for them (up to SYNC_TIMEOUT) while a calendar was never synced, so
+    # the engines don't start from an empty table. Otherwise they use the saved events until a sync writes changes.
+    # Without valid credentials nothing is synced until Licencias logs in: returns why, or None
+    global _work_calendars_checked, _work_calendars_skipped
+    now = time.monotonic()
+    with _syncs_lock:
+        if _work_calendars_checked is not None and now - _work_calendars_checked < SYNC_CHECK_INTERVAL:
+            return _work_calendars_skipped
+        _work_calendars_checked = now
+
+    if not has_credentials():
+        if _work_calendars_skipped is None:
+            logging.getLogger(__name__).warning("Calendars not synced: no valid credentials in token.json")
+        _work_calendars_skipped = "The calendars aren't synced: there are no valid credentials, open Licencias to log in"
+        return _work_calendars_skipped
+    _work_calendars_skipped = None
+
+    with engine.connect() as connection:
+        synced = set(connection.execute(text("SELECT calendar_id FROM holidays_sync")).scalars())
+    sync_calendars(
+        WORK_CALENDAR_IDS, fetch_work_calendar_page,
+        timeout=0 if synced.issuperset(WORK_CALENDAR_IDS) else SYNC_TIMEOUT
     )
-    ## Rename columns to Spanish month names
-    holidays.columns = holidays.columns.astype(str)
-    month_mapping = {f'2025-{i + 1:02d}': month for i, month in enumerate(MONTHS)}
-    holidays.rename(columns=month_mapping, inplace=True)
-    for month in MONTHS:
-        if month not in holidays.columns:
-            holidays[month] = 0
-    columns_to_keep = ['name'] + MONTHS
-    holidays = holidays[columns_to_keep]
+    return None
+
+
+def load_holidays(year, calendar_ids=LEAVE_CALENDAR_IDS):
+    # Events of the local copy of the calendars that overlap the year
+    query = """
+        SELECT name, start, "end", status FROM holidays
+        WHERE calendar_id IN (SELECT value FROM json_each(:calendar_ids)) AND "end" > :time_min AND start < :time_max
+        ORDER BY start
+    """
+    with engine.connect() as connection:
+        return pd.read_sql(text(query), connection, params={
+            'calendar_ids': json.dumps(list(calendar_ids)),
+            'time_min': f'{year}-01-01', 'time_max': f'{year}-12-31T23:59:59Z',
+        })
+
+
+def event_days(events):
+    # First and last day (both included) of calendar events. All-day events end the day before their end date
+    first = to_days(events['start'].str[:10])
+    last = to_days(events['end'].str[:10])
+    return first, np.where(events['end'].str.len() == 10, last - 1, last)
+
+
+def _person(name):
+    return unidecode(str(name)).casefold().strip()
+
+
+@derived('holidays', 'team_members')
+def work_calendar(start, end):
+    # Working days of each team member from start to end, extended to whole months (see utils.work_calendar). Events
+    # of the leave calendars are the leave of the team member they are named after
+    first_day = np.datetime64(start, 'M').astype('datetime64[D]')
+    last_day = (np.datetime64(end, 'M') + 1).astype('datetime64[D]') - 1
+    query = """
+        SELECT calendar_id, name, start, "end" FROM holidays
+        WHERE calendar_id IN (SELECT value FROM json_each(:calendar_ids)) AND "end" >= :start AND start <= :end
+    """
+    with engine.connect() as connection:
+        events = pd.read_sql(text(query), connection, params={
+            'calendar_ids': json.dumps(WORK_CALENDAR_IDS),
+            'start': str(first_day), 'end': f'{last_day}T23:59:59Z',
+        })
+    first, last = event_days(events)
+    national = (events['calendar_id'] == NATIONAL_CALENDAR_ID).to_numpy()
+
+    members = read_team_members()['Nombre'].tolist()
+    holidays = [day for a, b in zip(first[national], last[national]) for day in np.arange(a, b + 1)]
+    leaves = pd.DataFrame({
+        'member': events.loc[~national, 'name'].map(_person).map({_person(member): member for member in members}),
+        'start': first[~national],
+        'end': last[~national],
+    })
+    return build_work_calendar(start, end, members, holidays, leaves)
+
+
+@derived('holidays')
+def holidays_table(year):
+    # Days of each month of the year taken by each person, and the CSS of the table (banded rows)
+    df = load_holidays(year)
+
+    # How many days from each month are holidays: the days of each event (see event_days) in each month
+    first, last = event_days(df)
+    holidays = pd.DataFrame(month_overlap_days(first, last, year_months(year)), columns=MONTHS)
+    holidays.insert(0, 'name', df['name'].to_numpy())
 
     ## Group by name and sum
     holidays = holidays.groupby('name').sum().reset_index()
     holidays['name_sort'] = holidays['name'].apply(unidecode)
     holidays = holidays.sort_values(by=['name_sort']).reset_index().drop(columns=['name_sort', 'index'])
 
-    # Style the table
-    def highlight_rows(row):
-        return ['background-color: #ffffff' if row.name % 2 == 0 else 'background-color: #f5f5f5' for _ in row]
+    return holidays, css_frame(holidays, row_bands(len(holidays)))
+
+
+def show_holidays():
+    errors = sync_calendars(WORK_CALENDAR_IDS)
+    for calendar_id, e in errors.items():
+        st.warning(f"Error syncing the calendar {calendar_id}, showing the last saved holidays: {e}")
 
-    holidays_styled = holidays.style.apply(highlight_rows, axis=1)
+    holidays, css = holidays_table(planning_year())
 
     # _, col1, _ = st.columns([1, 4, 1])
     # with col1:
-    st.dataframe(
-        holidays_styled,
-        use_container_width=True,
-        height=750,
-        hide_index=True,
-        column_config={
-            # 'name': {'width': 150},
-            # **{month: {'width': 50} for month in MONTHS}
-            "name": st.column_config.TextColumn("Nombre"),#, width="medium"),
-            "Enero": st.column_config.NumberColumn("Enero"),#, width="small"),
-            "Febrero": st.column_config.NumberColumn("Feb."),#, width="small"),
-            "Marzo": st.column_config.NumberColumn("Marzo"),#, width="small"),
-            "Abril": st.column_config.NumberColumn("Abril"),#, width="small"),
-            "Mayo": st.column_config.NumberColumn("Mayo"),#, width="small"),
-            "Junio": st.column_config.NumberColumn("Junio"),#, width="small"),
-            "Julio": st.column_config.NumberColumn("Julio"),#, width="small"),
-            "Agosto": st.column_config.NumberColumn("Agosto"),#, width="small"),
-            "Setiembre": st.column_config.NumberColumn("Set."),#, width="small"),
-            "Octubre": st.column_config.NumberColumn("Oct."),#, width="small"),
-            "Noviembre": st.column_config.NumberColumn("Nov."),#, width="small"),
-            "Diciembre": st.column_config.NumberColumn("Dic."),#, width="small"),
-
-        },
-    )
\ No newline at end of file
+    with timer('render', 'Licencias'):
+        st.dataframe(
+            styled(holidays, css),
+            use_container_width=True,
+            height=750,
+            hide_index=True,
+            column_config={
+                # 'name': {'width': 150},
+                # **{month: {'width': 50} for month in MONTHS}
+                "name": st.column_config.TextColumn("Nombre"),#, width="medium"),
+                "Enero": st.column_config.NumberColumn("Enero"),#, width="small"),
+                "Febrero": st.column_config.NumberColumn("Feb."),#, width="small"),
+                "Marzo": st.column_config.NumberColumn("Marzo"),#, width="small"),
+                "Abril": st.column_config.NumberColumn("Abril"),#, width="small"),
+                "Mayo": st.column_config.NumberColumn("Mayo"),#, width="small"),
+                "Junio": st.column_config.NumberColumn("Junio"),#, width="small"),
+                "Julio": st.column_config.NumberColumn("Julio"),#, width="small"),
+                "Agosto": st.column_config.NumberColumn("Agosto"),#, width="small"),
+                "Setiembre": st.column_config.NumberColumn("Set."),#, width="small"),
+                "Octubre": st.column_config.NumberColumn("Oct."),#, width="small"),
+                "Noviembre": st.column_config.NumberColumn("Nov."),#, width="small"),
+                "Diciembre": st.column_config.NumberColumn("Dic."),#, width="small"),
+            },
+        )
\ No newline at end of file
@@ -1,11 +1,15 @@
-import calendar
+import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 
-from .team import load_team_members
-from .projects import load_projects
+from utils.cache import derived
+from utils.charts import cached_figure, donut, donut_row
+from utils.intervals import year_months
+from utils.planning import planning_year
+from utils.work_calendar import load_fraction, member_rows
+from .assignation_projects import month_hours, monthly_assignation
+from .holidays import work_calendar
+from .team import read_team_members
 
 
 MONTHS = [
@@ -18,114 +22,104 @@ QUARTERS = {
     'Q3': ['Julio', 'Agosto', 'Setiembre'],
     'Q4': ['Octubre', 'Noviembre', 'Diciembre']
 }
+NO_TYPE = 'Sin tipo'  # Tipo of the assignments that don't have one
+TOTAL = 'Total'
+
+
+@derived('team_members', 'holidays')
+def compute_monthly_available_hours(year):
+    # Hours each team member can work in each month of the year: the capacity of the month times the fraction of its
+    # working days the member works (see utils.work_calendar), the same way as the assigned hours
+    team_members = read_team_members()
+    work_cal = work_calendar(f'{year}-01-01', f'{year}-12-31')
+    months = year_months(year)
+    fraction = load_fraction(
+        work_cal, member_rows(work_cal, team_members['Nombre'])[:, None],
+        months.astype('datetime64[D]'), (months + 1).astype('datetime64[D]') - 1, np.arange(len(months))
+    )
 
+    available_hours = team_members[['Nombre']].copy()
+    available_hours[MONTHS] = np.nan_to_num(team_members[MONTHS].astype(float).to_numpy()) * fraction
+    return available_hours
 
-def compute_assignation_hours():
-    # TODO: refactor this. it is used at least in assignation_projects.py, assignation_total.py and metrics.py
 
-    load_projects()
-    projects = st.session_state.projects_data
+def assigned_by_member_type(assignation):
+    # Hours assigned to each team member in each month, by Tipo of the assignments: indexed by (Equipo, Tipo), only
+    # the rows with hours
+    rollup = assignation.assign(Tipo=assignation['Tipo'].fillna(NO_TYPE)).groupby(['Equipo', 'Tipo'])[MONTHS].sum()
+    return rollup[(rollup != 0).any(axis=1)]
 
-    assignation_days = projects.join(
-        projects.apply(lambda p: pd.Series(pd.date_range(p['Inicio'], p['Fin'], freq='D').to_period('M')), axis=1)
-        .apply(lambda x: pd.Series(x).value_counts(), axis=1)
-        .fillna(0)
-        .astype(int)
-    )
-    ## Rename columns to Spanish month names
-    assignation_days.columns = assignation_days.columns.astype(str)
-    month_mapping = {f'2025-{i + 1:02d}': month for i, month in enumerate(MONTHS)}
-    assignation_days.rename(columns=month_mapping, inplace=True)
 
-    # Convert to hours
-    assignation_hours = assignation_days.copy()
-    assignation_days['HorasMes'] = assignation_days['HorasMes'].astype(float)
-    days_in_month = {month: calendar.monthrange(2025, i + 1)[1] for i, month in enumerate(MONTHS)}
-    for month in MONTHS:
-        assignation_hours[month] = assignation_hours[month] / days_in_month[month] * assignation_days['HorasMes']
-    assignation_hours[MONTHS] = assignation_hours[MONTHS].astype(int)
+@derived('projects', 'team_members', 'holidays')
+def monthly_utilization(year):
+    # Rollup of the hours assigned in each month of the year, by team member and Tipo (see assigned_by_member_type).
+    # Kept up to date by the saves of the projects, so the page never sums the assignments again. It isn't a table of
+    # the store: it lives in the derived cache of each process, so every Streamlit server and the API build their own
+    # from the assignments on first use, and a process only updates it from its own saves (the saves of the others
+    # bump the revision and it is computed again)
+    return assigned_by_member_type(monthly_assignation(year))
 
-    return assignation_hours
 
+@monthly_utilization.incremental('projects')
+def _update_monthly_utilization(rollup, change, year):
+    # The hours of the saved rows are taken out as they were before the save and added as they are after it
+    before, after = change
+    rows = month_hours(pd.concat([before, after], ignore_index=True), year)
+    keys = pd.MultiIndex.from_arrays([rows['Equipo'], rows['Tipo'].fillna(NO_TYPE)], names=rollup.index.names)
+    sign = np.repeat([-1, 1], [len(before), len(after)])
 
-def show_metrics():
+    new_keys = keys.difference(rollup.index)
+    if len(new_keys):
+        rollup = pd.concat([rollup, pd.DataFrame(0, index=new_keys, columns=MONTHS)]).sort_index()
+    hours = np.array(rollup[MONTHS].to_numpy())
+    np.add.at(hours, rollup.index.get_indexer(keys), sign[:, None] * rows[MONTHS].to_numpy())
+    rollup = pd.DataFrame(hours, index=rollup.index, columns=MONTHS)
+    return rollup[(hours != 0).any(axis=1)]
 
-    load_team_members()
-    team_members = st.session_state.team_data
-    team_members[MONTHS] = team_members[MONTHS].apply(lambda x: x.astype(int))
 
-    assignation_hours = compute_assignation_hours()
+def quarterly(monthly):
+    # Sums of the months of each quarter (columns)
+    return pd.DataFrame({quarter: monthly[months].sum(axis=1) for quarter, months in QUARTERS.items()})
 
-    available_hours = team_members[MONTHS].sum(axis=0)
-    assigned_hours = assignation_hours[MONTHS].sum(axis=0)
-    metric = assigned_hours / available_hours * 100
-    metric = metric.round(0).astype(int)
-    df_monthly_metric = metric.to_frame(name='% Asignación').T
 
-    # Calculate metrics by quarter
-    metric_by_quarter = {}
-    for quarter, months in QUARTERS.items():
-        metric_by_quarter[quarter] = metric[months].sum() / len(months)
-    df_quarter_metric = pd.Series(metric_by_quarter).round(0).to_frame(name='% Asignación').T
+def utilization(assigned_hours, available_hours):
+    # Percent of the available hours that are assigned, NaN where nothing is available
+    return 100 * assigned_hours / available_hours.where(available_hours != 0)
 
-    st.header("% de asignación por quarter")
-    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
-    with col1:
-        fig = go.Figure(data=[go.Pie(
-            labels=['Asignado', 'Libre'],
-            values=[df_quarter_metric['Q1']['% Asignación'], 100 - df_quarter_metric['Q1']['% Asignación']],
-            title=dict(text=f"Q1: {df_quarter_metric['Q1']['% Asignación']:.0f}%", font=dict(size=40)),
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4,
-        )])
-        fig.update_layout(
-            title=dict(text='', font=dict(size=24)),
-            margin=dict(t=0, b=0, l=0, r=0),
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    with col2:
-        fig = go.Figure(data=[go.Pie(
-            labels=['Asignado', 'Libre'],
-            values=[df_quarter_metric['Q2']['% Asignación'], 100 - df_quarter_metric['Q2']['% Asignación']],
-            title=dict(text=f"Q2: {df_quarter_metric['Q2']['% Asignación']:.0f}%", font=dict(size=40)),
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4,
-        )])
-        fig.update_layout(
-            title=dict(text='', font=dict(size=24)),
-            margin=dict(t=0, b=0, l=0, r=0),
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    with col3:
-        fig = go.Figure(data=[go.Pie(
-            labels=['Asignado', 'Libre'],
-            values=[df_quarter_metric['Q3']['% Asignación'], 100 - df_quarter_metric['Q3']['% Asignación']],
-            title=dict(text=f"Q3: {df_quarter_metric['Q3']['% Asignación']:.0f}%", font=dict(size=40)),
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4,
-        )])
-        fig.update_layout(
-            title=dict(text='', font=dict(size=24)),
-            margin=dict(t=0, b=0, l=0, r=0),
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    with col4:
-        fig = go.Figure(data=[go.Pie(
-            labels=['Asignado', 'Libre'],
-            values=[df_quarter_metric['Q4']['% Asignación'], 100 - df_quarter_metric['Q4']['% Asignación']],
-            title=dict(text=f"Q4: {df_quarter_metric['Q4']['% Asignación']:.0f}%", font=dict(size=40)),
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4,
-        )])
-        fig.update_layout(
-            title=dict(text='', font=dict(size=24)),
-            margin=dict(t=0, b=0, l=0, r=0),
+
+def quarter_donuts(assigned):
+    # Donuts of the % assigned in each quarter, in one figure
+    return donut_row([
+        donut(
+            ['Asignado', 'Libre'], [percent, 100 - percent], dict(text=f"{quarter}: {percent:.0f}%", font=dict(size=40))
         )
-        st.plotly_chart(fig, use_container_width=True)
+        for quarter, percent in zip(QUARTERS, assigned)
+    ])
+
+
+def show_metrics():
+
+    year = planning_year()
+    rollup = monthly_utilization(year)
+    available_hours = compute_monthly_available_hours(year).set_index('Nombre')[MONTHS]
+
+    # % of the hours of the whole team assigned in each month, in total and by Tipo (rows)
+    assigned_by_type = rollup.groupby(level='Tipo').sum()
+    assigned_by_type.loc[TOTAL] = assigned_by_type.sum(axis=0)
+    assigned_by_type = assigned_by_type.loc[[TOTAL, *assigned_by_type.index.drop(TOTAL)]]
+    metric = utilization(assigned_by_type, available_hours.sum(axis=0)).round(0)
+    df_monthly_metric = metric.astype('Int64').rename_axis('Tipo').reset_index()
+
+    # Calculate metrics by quarter: the mean of the months
+    metric_by_quarter = pd.DataFrame({quarter: metric[months].mean(axis=1) for quarter, months in QUARTERS.items()})
+    df_quarter_metric = metric_by_quarter.round(0).rename_axis('Tipo').reset_index()
+
+    st.header("% de asignación por quarter")
+    selected_type = st.radio(
+        "Tipo", metric.index, key='metrics_type', horizontal=True, label_visibility='collapsed'
+    )
+    fig = cached_figure(quarter_donuts, tuple(metric_by_quarter.loc[selected_type]))
+    st.plotly_chart(fig, use_container_width=True)
 
     _, col1, _ = st.columns([2, 4, 2])
     with col1:
@@ -142,4 +136,22 @@ def show_metrics():
             df_monthly_metric,
             use_container_width=True,
             hide_index=True,
-        )
\ No newline at end of file
+        )
+
+    # % of the hours of each team member assigned in each quarter, for the selected Tipo
+    st.header("% de asignación por persona")
+    if selected_type == TOTAL:
+        assigned_by_member = rollup.groupby(level='Equipo').sum()
+    else:
+        assigned_by_member = rollup.xs(selected_type, level='Tipo')
+    available_by_member = quarterly(available_hours)
+    df_member_metric = utilization(
+        quarterly(assigned_by_member).reindex(available_by_member.index, fill_value=0), available_by_member
+    ).round(0).astype('Int64').rename_axis('Nombre').reset_index()
+    _, col1, _ = st.columns([2, 4, 2])
+    with col1:
+        st.dataframe(
+            df_member_metric,
+            use_container_width=True,
+            hide_index=True,
+        )
@@ -1,52 +1,119 @@
-import time
+import json
+import threading
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-from datetime import date, datetime
-from sqlalchemy import create_engine, text
-
+from datetime import datetime
+from sqlalchemy import text
+
+from utils.cache import bump_revision, derived, get_revision
+from utils.interval_index import GroupedIntervalIndex
+from utils.session import session_table
+from utils.persistence import allocate_ids, diff_rows, has_changes, save_rows
+from utils.storage import engine
+from utils.writer import report_write, submit_write
 from .team import load_team_members
 
-# Database connection
-DATABASE_URL = "sqlite:///data/projects.db"
-engine = create_engine(DATABASE_URL)
-
 COLUMNS = ['Proyecto', 'Tipo', 'Inicio', 'Fin', 'Equipo', 'HorasMes']
 
 
-def create_projects_table():
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS projects (
-        Proyecto TEXT,
-        Tipo TEXT,
-        Inicio DATETIME,
-        Fin DATETIME,
-        Equipo TEXT,
-        HorasMes NUMBER
-    )
-    """
-    with engine.connect() as connection:
-        connection.execute(text(create_table_query))
+def _parse_dates(df):
+    df['Inicio'] = pd.to_datetime(df['Inicio'])
+    df['Fin'] = pd.to_datetime(df['Fin'])
+    return df
+
+
+@derived('projects')
+def read_projects():
+    query = "SELECT * FROM projects"
+    return _parse_dates(pd.read_sql(query, engine))
+
+
+def read_project_rows(connection, ids):
+    # Rows of some projects, as read_projects returns them
+    query = text("SELECT * FROM projects WHERE id IN (SELECT value FROM json_each(:ids)) ORDER BY id")
+    return _parse_dates(pd.read_sql(query, connection, params={'ids': json.dumps([int(i) for i in ids])}))
+
+
+# Interval index of the projects by id, with the revision it was built for. Saves update it in place
+_project_index = None
+_project_index_lock = threading.Lock()
+
+
+def project_index():
+    # Index of the project assignments by date range, for every team member (Equipo) and for each one
+    global _project_index
+    with _project_index_lock:
+        revision = get_revision('projects')
+        if _project_index is None or _project_index[0] != revision:
+            projects = read_projects()
+            index = GroupedIntervalIndex(projects['id'], projects['Inicio'], projects['Fin'], projects['Equipo'])
+            _project_index = (revision, index)
+        return _project_index[1]
+
+
+def overlapping_rows(projects, start, end, member=None):
+    # Positions in `projects` (as returned by read_projects) of the assignments that overlap [start, end], of
+    # every team member or of one
+    ids = project_index().overlapping(start, end, member)
+    positions = pd.Index(projects['id']).get_indexer(ids)
+    return np.sort(positions[positions >= 0])
+
+
+def _update_projects(before, after):
+    # Bump the revision of the projects after a save that changed the rows `before` into `after` (both as read by
+    # read_project_rows). The index is updated in place when it was up to date, and so are the derived data with
+    # incremental updates (see utils.cache.bump_revision)
+    global _project_index
+    with _project_index_lock:
+        revision = get_revision('projects')
+        if _project_index is not None and _project_index[0] == revision:
+            index = _project_index[1]
+            index.remove(sorted(set(before['id']) - set(after['id'])))
+            index.upsert(after['id'], after['Inicio'], after['Fin'], after['Equipo'])
+            _project_index = (revision + 1, index)
+
+    # Outside the lock: the incremental updates may use the index. If another process saved the projects in between,
+    # the revision goes past revision + 1 and the index is rebuilt on its next use
+    bump_revision('projects', (before, after))
 
 
 def load_projects():
+    try:
+        session_table('projects_data', 'projects_editor', 'projects_write', read_projects)
+    except Exception as e:
+        st.error(f"Error loading projects: {e}")
+        st.session_state.projects_data = pd.DataFrame(columns=['id'] + COLUMNS)
 
-    # Create the table if it doesn't exist
-    create_projects_table()
 
-    if 'projects_data' not in st.session_state:
-        try:
-            query = "SELECT * FROM projects"
-            df = pd.read_sql(query, engine)
-            df['Inicio'] = pd.to_datetime(df['Inicio'])
-            df['Fin'] = pd.to_datetime(df['Fin'])
-            st.session_state.projects_data = df
-        except Exception as e:
-            st.error(f"Error loading projects: {e}")
-            st.session_state.projects_data = pd.DataFrame(columns=COLUMNS)
+def save_projects(df, persisted=None):
+    # Queue a write of the rows that changed with respect to the persisted snapshot. Returns the write ticket (None
+    # when nothing changed) and the new snapshot, where new rows already have their ids
+    if persisted is None:
+        persisted = read_projects()
 
+    snapshot = df[['id'] + COLUMNS].reset_index(drop=True)
+    snapshot['id'] = pd.to_numeric(snapshot['id'], errors='coerce')
+    inserted, updated, deleted_ids = diff_rows(persisted, snapshot, COLUMNS)
+    if not has_changes(inserted, updated, deleted_ids):
+        return None, persisted
 
-def save_projects(df):
-    df.to_sql('projects', engine, if_exists='replace', index=False)
+    snapshot.loc[inserted.index, 'id'] = allocate_ids(engine, 'projects', len(inserted))
+    snapshot['id'] = snapshot['id'].astype(int)
+    inserted = snapshot.loc[inserted.index]
+
+    # The written rows are read before and after the write, in its transaction
+    ids = list(inserted['id']) + list(updated['id']) + list(deleted_ids)
+    rows = {}
+
+    def write(connection):
+        rows['before'] = read_project_rows(connection, ids)
+        save_rows(connection, 'projects', COLUMNS, inserted, updated, deleted_ids)
+        rows['after'] = read_project_rows(connection, ids)
+
+    ticket = submit_write(engine, write, on_commit=lambda: _update_projects(rows['before'], rows['after']))
+    return ticket, snapshot
 
 
 def calculate_project_progress(start_date, end_date):
@@ -66,31 +133,42 @@ def calculate_project_progress(start_date, end_date):
 
 def show_projects():
 
+    if not report_write('projects_write'):
+        # The last save failed: start again from the saved table
+        st.session_state.pop('projects_data', None)
+
     load_projects()
     load_team_members()
 
-    # Calculate progress for each project
-    st.session_state.projects_data['Progreso'] = st.session_state.projects_data.apply(
+    # Calculate progress for each project. It is only displayed, not persisted
+    projects_data = st.session_state.projects_data
+    projects_data = projects_data.assign(Progreso=projects_data.apply(
         lambda row: calculate_project_progress(row['Inicio'], row['Fin']), axis=1
-    )
+    ))
 
-    def save_changes():
+    def save_changes(edited_projects_data):
         try:
-            save_projects(st.session_state.edited_projects_data)
-            message = st.success('Changes saved successfully!', )
+            ticket, snapshot = save_projects(edited_projects_data, st.session_state.projects_data)
         except Exception as e:
-            message = st.error(f"Error saving changes: {e}")
-        time.sleep(1)
-        message.empty()
-
-    st.session_state.edited_projects_data = st.data_editor(
-        st.session_state.projects_data,
+            st.error(f"Error saving changes: {e}")
+            return
+
+        if ticket is not None:
+            # The editor starts again from the edited table, where new rows already have their ids
+            st.session_state.projects_write = ticket
+            st.session_state.projects_data = snapshot
+            st.rerun()
+
+    edited_projects_data = st.data_editor(
+        projects_data,
+        key='projects_editor',
         num_rows="dynamic",
         use_container_width=True,
         hide_index=True,
         height=600,
         # on_change=save_changes,
         column_config={
+            "id": None,
             "Tipo": st.column_config.SelectboxColumn(
                 "Tipo",
                 help="Facturable o no. Sirve para diferenciar proyectos internos, y calcular métricas de ocupación",
@@ -105,8 +183,6 @@ def show_projects():
                 "Inicio",
                 help="Fecha de inicio de la asignación del miembro del equipo al proyecto",
                 width="small",
-                min_value=date(2025, 1, 1),
-                max_value=date(2025, 12, 31),
                 format="YYYY.MM.DD",
                 step=1,
                 # required=True,
@@ -115,8 +191,6 @@ def show_projects():
                 "Fin",
                 help="Fecha de fin de la asignación del miembro del equipo al proyecto",
                 width="small",
-                min_value=date(2025, 1, 1),
-                max_value=date(2025, 12, 31),
                 format="YYYY.MM.DD",
                 step=1,
                 # required=True,
@@ -135,7 +209,7 @@ def show_projects():
             ),
         },
     )
-    save_changes()
+    save_changes(edited_projects_data)
 
     # if st.button("Refresh Team Data"):
     # refresh_team_data()
@@ -1,78 +1,93 @@
-import time
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine, text
-import plotly.graph_objects as go
-import plotly.express as px
 
+from utils.cache import bump_revision, derived
+from utils.charts import cached_figure, donut, donut_row
+from utils.session import session_table
+from utils.persistence import allocate_ids, diff_rows, has_changes, save_rows
+from utils.storage import engine
+from utils.writer import report_write, submit_write
 
-# Database connection
-DATABASE_URL = "sqlite:///data/team_members.db"  # Update this with your database URL
-engine = create_engine(DATABASE_URL)
 
 COLUMNS = [
     'Nombre', 'Rol', 'Grado', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto', 'Setiembre',
     'Octubre', 'Noviembre', 'Diciembre'
 ]
 
-def create_team_members_table():
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS team_members (
-        Nombre TEXT,
-        Rol TEXT,
-        Grado TEXT,
-        Enero NUMBER,
-        Febrero NUMBER,
-        Marzo NUMBER,
-        Abril NUMBER,
-        Mayo NUMBER,
-        Junio NUMBER,
-        Julio NUMBER,
-        Agosto NUMBER,
-        Setiembre NUMBER,
-        Octubre NUMBER,
-        Noviembre NUMBER,
-        Diciembre NUMBER
-    )
-    """
-    with engine.connect() as connection:
-        connection.execute(text(create_table_query))
+@derived('team_members')
+def read_team_members():
+    query = "SELECT * FROM team_members"
+    return pd.read_sql(query, engine)
 
 def load_team_members():
-    create_team_members_table()
-    if 'team_data' not in st.session_state:
-        try:
-            query = "SELECT * FROM team_members"
-            st.session_state.team_data =  pd.read_sql(query, engine)
-        except Exception as e:
-            st.error(f"Error loading team members: {e}")
-            st.session_state.team_data = pd.DataFrame(columns=COLUMNS)
+    try:
+        session_table('team_data', 'team_editor', 'team_write', read_team_members)
+    except Exception as e:
+        st.error(f"Error loading team members: {e}")
+        st.session_state.team_data = pd.DataFrame(columns=['id'] + COLUMNS)
+
+
+def save_team_members(df, persisted=None):
+    # Queue a write of the rows that changed with respect to the persisted snapshot. Returns the write ticket (None
+    # when nothing changed) and the new snapshot, where new rows already have their ids
+    if persisted is None:
+        persisted = read_team_members()
+
+    snapshot = df[['id'] + COLUMNS].reset_index(drop=True)
+    snapshot['id'] = pd.to_numeric(snapshot['id'], errors='coerce')
+    inserted, updated, deleted_ids = diff_rows(persisted, snapshot, COLUMNS)
+    if not has_changes(inserted, updated, deleted_ids):
+        return None, persisted
 
+    snapshot.loc[inserted.index, 'id'] = allocate_ids(engine, 'team_members', len(inserted))
+    snapshot['id'] = snapshot['id'].astype(int)
+    inserted = snapshot.loc[inserted.index]
+
+    def write(connection):
+        save_rows(connection, 'team_members', COLUMNS, inserted, updated, deleted_ids)
+
+    ticket = submit_write(engine, write, on_commit=lambda: bump_revision('team_members'))
+    return ticket, snapshot
+
+def team_donuts(chart_data_role, chart_data_grade):
+    # Team members by role and by grade, in one figure. The labels are on the slices: a shared legend would mix both
+    return donut_row([
+        donut(chart_data_role['Rol'], chart_data_role['count'], 'Team Members by Roles'),
+        donut(chart_data_grade['Grado'], chart_data_grade['count'], 'Team Members by Grade'),
+    ], showlegend=False)
 
-def save_team_members(df):
-    df.to_sql('team_members', engine, if_exists='replace', index=False)
 
 def show_team():
 
+    if not report_write('team_write'):
+        # The last save failed: start again from the saved table
+        st.session_state.pop('team_data', None)
+
     load_team_members()
 
-    def save_changes():
+    def save_changes(edited_team_data):
         try:
-            save_team_members(st.session_state.edited_team_data)
-            message = st.success('Changes saved successfully!', )
+            ticket, snapshot = save_team_members(edited_team_data, st.session_state.team_data)
         except Exception as e:
-            message = st.error(f"Error saving changes: {e}")
-        time.sleep(1)
-        message.empty()
+            st.error(f"Error saving changes: {e}")
+            return
+
+        if ticket is not None:
+            # The editor starts again from the edited table, where new rows already have their ids
+            st.session_state.team_write = ticket
+            st.session_state.team_data = snapshot
+            st.rerun()
 
-    st.session_state.edited_team_data = st.data_editor(
+    edited_team_data = st.data_editor(
         st.session_state.team_data,
+        key='team_editor',
         num_rows="dynamic",
         use_container_width=True,
         hide_index=True,
         height=500,
         # on_change=save_changes,
         column_config={
+            "id": None,
             "Grado": st.column_config.SelectboxColumn(
                 "Grado",
                 help="Maximo nivel académico alcanzado",
@@ -117,41 +132,12 @@ def show_team():
             "Diciembre": st.column_config.NumberColumn("Dic.", width="small"),
         },
     )
-    save_changes()
+    save_changes(edited_team_data)
 
     # ---------------------------------------------------------------
     # Add Charts
-    chart_data_role = st.session_state.edited_team_data.groupby('Rol').size().reset_index(name='count')
-    chart_data_grade = st.session_state.edited_team_data.groupby('Grado').size().reset_index(name='count')
-
-    col1, col2 = st.columns([1, 1])  # Use equal ratio for dynamic adjustment
-
-    with col1:
-        fig1 = go.Figure(data=[go.Pie(
-            labels=chart_data_role['Rol'],
-            values=chart_data_role['count'],
-            title='Team Members by Roles',
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4
-        )])
-        fig1.update_layout(
-            title=dict(font=dict(size=24)),
-            margin=dict(t=0, b=0, l=0, r=0)
-        )
-        st.plotly_chart(fig1, use_container_width=True)
-
-    with col2:
-        fig2 = go.Figure(data=[go.Pie(
-            labels=chart_data_grade['Grado'],
-            values=chart_data_grade['count'],
-            title='Team Members by Grade',
-            marker=dict(colors=px.colors.qualitative.Vivid),
-            textinfo='label+percent',
-            hole=0.4
-        )])
-        fig2.update_layout(
-            title=dict(font=dict(size=24)),
-            margin=dict(t=0, b=0, l=0, r=0)
-        )
-        st.plotly_chart(fig2, use_container_width=True)
+    chart_data_role = edited_team_data.groupby('Rol').size().reset_index(name='count')
+    chart_data_grade = edited_team_data.groupby('Grado').size().reset_index(name='count')
+
+    fig = cached_figure(team_donuts, chart_data_role, chart_data_grade)
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,42 @@
+import pandas as pd
+
+# The Boost grid has one row per team member and one column per week, plus the Inicio/Fin header rows and the
+# _Inicio row with the full start date of each week. It is stored as cells: (member, week_start, hours, label)
+
+HEADER_ROWS = ['Inicio', 'Fin', '_Inicio']
+
+
+def grid_to_cells(grid):
+    # Non-empty cells of the grid. Numbers are hours, anything else (e.g. a project name) is kept as a label
+    grid = grid.set_index('Semana')
+    week_starts = grid.loc['_Inicio']
+    cells = grid.drop(HEADER_ROWS, errors='ignore').rename(columns=week_starts)
+    cells = cells.rename_axis(index='member', columns='week_start').stack().rename('value').reset_index()
+    cells['value'] = cells['value'].fillna('').astype(str).str.strip()
+    cells = cells[(cells['value'] != '') & (cells['value'] != 'None')]
+
+    hours = pd.to_numeric(cells['value'], errors='coerce')
+    return pd.DataFrame({
+        'member': cells['member'],
+        'week_start': cells['week_start'],
+        'hours': hours,
+        'label': cells['value'].where(hours.isna()),
+    }).reset_index(drop=True)
+
+
+def cell_text(hours, label):
+    if pd.notna(hours):
+        return f'{hours:g}'
+    return label if pd.notna(label) else ''
+
+
+def cell_records(cells):
+    return [
+        {
+            'member': row.member,
+            'week_start': row.week_start,
+            'hours': None if pd.isna(row.hours) else float(row.hours),
+            'label': None if pd.isna(row.label) else row.label,
+        }
+        for row in cells.itertuples()
+    ]
@@ -0,0 +1,140 @@
+import collections
+import copy
+import dataclasses
+import functools
+import threading
+
+import pandas as pd
+from sqlalchemy import text
+
+from .profiling import timer
+from .storage import engine
+
+# Revision counter of each table. Every save bumps the revision of the table it writes, which invalidates the derived
+# data computed from it. The counters are also stored in the revisions table, so other processes sharing the store
+# (the app and the API) see the saves of each other after refresh_revisions()
+_revisions = {}
+_derived = collections.OrderedDict()  # Key -> (revisions, value), least recently used first
+_updaters = collections.defaultdict(list)  # Table -> incremental updates of the derived functions that use it
+_lock = threading.Lock()
+
+DERIVED_ARGUMENTS = 16  # Argument sets whose values are kept per derived function (e.g. the ranges asked to the API)
+
+BUMP_REVISION = text(
+    "INSERT INTO revisions (name, revision) VALUES (:name, 1) "
+    "ON CONFLICT (name) DO UPDATE SET revision = revision + 1 RETURNING revision"
+)
+
+
+def get_revision(table):
+    return _revisions.get(table, 0)
+
+
+def bump_revision(table, change=None):
+    # With `change`, a description of the rows the save wrote (in the form the incremental updates of the table
+    # expect, see derived), the derived values of the previous revision are updated from it instead of being
+    # recomputed on their next call
+    with engine.begin() as connection:
+        revision = connection.execute(BUMP_REVISION, {'name': table}).scalar()
+    with _lock:
+        previous = dict(_revisions)
+        _revisions[table] = max(revision, get_revision(table) + 1)
+        current = _revisions[table]
+
+    # Only when no other process saved the table in between: the change is then the whole difference
+    if change is not None and current == previous.get(table, 0) + 1:
+        _update_derived(table, change, previous, current)
+
+
+def _update_derived(table, change, previous, current):
+    for name, tables, update in _updaters[table]:
+        stale = tuple(previous.get(t, 0) for t in tables)
+        revisions = tuple(current if t == table else previous.get(t, 0) for t in tables)
+        with _lock:
+            entries = list(_derived.items())
+        for key, entry in entries:
+            if key[:2] != name or entry[0] != stale:
+                continue
+            try:
+                with timer('compute', f'{name[0]}.{name[1]} (incremental)'):
+                    value = update(_copy(entry[1]), change, *key[2], **dict(key[3]))
+            except Exception:
+                # Left stale: it is recomputed on its next call
+                continue
+            with _lock:
+                if key in _derived:  # Unless evicted meanwhile
+                    _derived[key] = (revisions, value)
+
+
+def refresh_revisions():
+    # Catch up with the saves of other processes. One small query, run at the start of each rerun or request
+    with engine.connect() as connection:
+        stored = dict(connection.execute(text("SELECT name, revision FROM revisions")).all())
+    with _lock:
+        for table, revision in stored.items():
+            if revision > get_revision(table):
+                _revisions[table] = revision
+
+
+def _copy(value):
+    # Callers modify what they get (add columns, fill values...), so the cached value is never handed out: pandas
+    # objects are copied with their data (well under a millisecond for thousands of rows)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy(item) for item in value)
+    if dataclasses.is_dataclass(value) and value.__dataclass_params__.frozen:
+        return value  # Immutable, with read-only arrays (e.g. the calendars)
+    return copy.deepcopy(value)
+
+
+def _evict(name):
+    # Keep the values of the DERIVED_ARGUMENTS most recently used argument sets of a function. Called with _lock held
+    keys = [key for key in _derived if key[:2] == name]
+    for key in keys[:max(len(keys) - DERIVED_ARGUMENTS, 0)]:
+        del _derived[key]
+
+
+def derived(*tables):
+    # Memoize a function that derives data from some tables. The result is computed once per revision of those
+    # tables (process-wide, shared by all sessions, replaced as a whole when a revision changes) and callers get
+    # their own copy, so they can modify it freely.
+    # Arguments are part of the key, so they must be hashable. Only the values of the DERIVED_ARGUMENTS most recently
+    # used argument sets are kept
+    # func.incremental(table) registers update(value, change, *args, **kwargs), which returns the value after a save
+    # of the table from the value before it and the change passed to bump_revision. Updates of a table run in the
+    # order they were registered, so an update can use the already updated value of a function registered before
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            revisions = tuple(get_revision(table) for table in tables)
+
+            with _lock:
+                entry = _derived.get(key)
+                if entry is not None:
+                    _derived.move_to_end(key)
+            if entry is None or entry[0] != revisions:
+                with timer('compute', name):
+                    entry = (revisions, func(*args, **kwargs))
+                with _lock:
+                    _derived[key] = entry
+                    _derived.move_to_end(key)
+                    _evict(key[:2])
+
+            with timer('cache', name):
+                return _copy(entry[1])
+
+        def incremental(table):
+            def register(update):
+                _updaters[table].append(((func.__module__, func.__qualname__), tables, update))
+                return update
+
+            return register
+
+        wrapper.incremental = incremental
+        return wrapper
+
+    return decorator
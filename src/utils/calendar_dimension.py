@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CalendarDimension:
+    # Calendar of a range of days, split in weeks from Monday to Sunday. Every array is read-only
+    start: np.datetime64  # First day of the range
+    end: np.datetime64  # Last day of the range
+    months: np.ndarray  # datetime64[M], every month of the range
+    month_business_days: np.ndarray  # Business days of each month
+    week_numbers: np.ndarray  # 1, 2, ... (week index used as column name in the weekly tables)
+    iso_weeks: np.ndarray  # ISO 8601 week number of each week
+    week_starts: np.ndarray  # datetime64[D], Monday of each week
+    week_ends: np.ndarray  # datetime64[D], Sunday of each week
+    week_months: np.ndarray  # Index in `months` of the month each week belongs to
+    week_business_days: np.ndarray  # Business days of each week that fall in the range
+    week_month_business_days: np.ndarray  # (weeks x months) business days of each week in each month
+
+
+def _read_only(*arrays):
+    for array in arrays:
+        array.flags.writeable = False
+
+
+@lru_cache(maxsize=64)
+def build_calendar_range(start, end):
+    # Calendar of the days from start to end (dates as 'YYYY-MM-DD'). Months are counted whole, even when the range
+    # only covers part of them
+    start = np.datetime64(start, 'D')
+    end = np.datetime64(end, 'D')
+
+    months = np.arange(start.astype('datetime64[M]'), end.astype('datetime64[M]') + 1)
+    month_starts = months.astype('datetime64[D]')
+    month_ends = (months + 1).astype('datetime64[D]') - 1
+    month_business_days = np.busday_count(month_starts, month_ends + 1)
+
+    # Weeks start from the first Monday of the range or the last Monday before it, and end when a week no longer
+    # touches the range
+    first_monday = start - (start.astype(int) + 3) % 7  # Weekday with Monday = 0, as 1970-01-01 was a Thursday
+    week_starts = np.arange(first_monday, end + 1, 7, dtype='datetime64[D]')
+    week_ends = week_starts + 6
+    week_numbers = np.arange(1, len(week_starts) + 1)
+
+    # ISO week: the week of the year of its Thursday
+    thursdays = week_starts + 3
+    iso_weeks = (thursdays - thursdays.astype('datetime64[Y]').astype('datetime64[D]')).astype(int) // 7 + 1
+
+    # A week belongs to the month of its Monday, or of the first day of the range for the first week
+    week_months = (np.maximum(week_starts, start).astype('datetime64[M]') - months[0]).astype(int)
+
+    # Business days of each week in each month, counting only the days of the range
+    first = np.maximum(week_starts[:, None], np.maximum(month_starts, start)[None, :])
+    last = np.minimum(week_ends[:, None], np.minimum(month_ends, end)[None, :])
+    week_month_business_days = np.busday_count(first, np.maximum(last + 1, first))
+    week_business_days = week_month_business_days.sum(axis=1)
+
+    _read_only(
+        months, month_business_days, week_numbers, iso_weeks, week_starts, week_ends, week_months,
+        week_business_days, week_month_business_days
+    )
+    return CalendarDimension(
+        start=start,
+        end=end,
+        months=months,
+        month_business_days=month_business_days,
+        week_numbers=week_numbers,
+        iso_weeks=iso_weeks,
+        week_starts=week_starts,
+        week_ends=week_ends,
+        week_months=week_months,
+        week_business_days=week_business_days,
+        week_month_business_days=week_month_business_days,
+    )
+
+
+def build_calendar(first_year, last_year):
+    return build_calendar_range(f'{first_year}-01-01', f'{last_year}-12-31')
+
+
+def year_calendar(year):
+    return build_calendar(year, year)
@@ -0,0 +1,70 @@
+import collections
+import hashlib
+import threading
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Plotly figures built once for each value of the data they show, shared by every session and rerun. Building a figure
+# (validating every property) is what costs in a chart; handing an already built one to st.plotly_chart only
+# serializes it. The pages aggregate their data (a few counts or percents), and cached_figure builds the figure the
+# first time it sees those aggregates
+
+CACHED_FIGURES = 64
+
+_figures = collections.OrderedDict()  # Key -> figure, least recently used first
+_figures_lock = threading.Lock()
+
+
+def _fingerprint(value):
+    if isinstance(value, pd.DataFrame):
+        return repr(list(value.columns)).encode() + pd.util.hash_pandas_object(value).to_numpy().tobytes()
+    if isinstance(value, pd.Series):
+        return repr(value.name).encode() + pd.util.hash_pandas_object(value).to_numpy().tobytes()
+    return repr(value).encode()
+
+
+def cached_figure(build, *aggregates):
+    # The figure build(*aggregates) returns, from the cache when the aggregates (frames, series or plain values) are
+    # the same as in a previous call. Cached figures are shared: they must not be modified
+    digest = hashlib.sha1()
+    for value in aggregates:
+        digest.update(_fingerprint(value))
+        digest.update(b'\0')
+    key = (build.__module__, build.__qualname__, digest.hexdigest())
+
+    with _figures_lock:
+        figure = _figures.get(key)
+        if figure is not None:
+            _figures.move_to_end(key)
+            return figure
+
+    figure = build(*aggregates)
+    with _figures_lock:
+        _figures[key] = figure
+        while len(_figures) > CACHED_FIGURES:
+            _figures.popitem(last=False)
+    return figure
+
+
+def donut(labels, values, title):
+    # The donut of the pages: a slice per label, with its label and percent
+    return go.Pie(
+        labels=labels,
+        values=values,
+        title=title,
+        marker=dict(colors=px.colors.qualitative.Vivid),
+        textinfo='label+percent',
+        hole=0.4,
+    )
+
+
+def donut_row(donuts, showlegend=True):
+    # Several donuts side by side in one figure: one chart (and one payload) instead of one per donut
+    figure = make_subplots(rows=1, cols=len(donuts), specs=[[{'type': 'domain'}] * len(donuts)])
+    for col, trace in enumerate(donuts, start=1):
+        figure.add_trace(trace, row=1, col=col)
+    figure.update_layout(showlegend=showlegend, margin=dict(t=0, b=0, l=0, r=0))
+    return figure
@@ -40,6 +40,18 @@ def apply_tabs_spacing():
     """
     st.markdown(tabs_spacing, unsafe_allow_html=True)
 
+def apply_navigation_spacing():
+    navigation_spacing = """
+        <style>
+            div[role="radiogroup"] {
+                display: flex;
+                justify-content: center;  /* Center the pages selector */
+                gap: 30px;  /* Add gap between pages */
+            }
+        </style>
+    """
+    st.markdown(navigation_spacing, unsafe_allow_html=True)
+
 def remove_top_padding():
     top_padding = """
         <style>
@@ -62,6 +74,7 @@ def add_title():
 def apply_all_configs():
     set_page_config()
     # hide_sidebar()  # Not needed anymore, as I added it in the .streamlit/config.toml
-    apply_tabs_spacing()
+    # apply_tabs_spacing()  # Not needed anymore, pages are selected with a radio instead of tabs
+    apply_navigation_spacing()
     remove_top_padding()
     add_title()
@@ -0,0 +1,152 @@
+import threading
+
+import numpy as np
+
+from .intervals import to_days
+
+
+class IntervalIndex:
+    # Closed [start, end] date intervals, identified by a key, in buckets by length: bucket k holds the intervals whose
+    # length (end - start, in days) has k bits, so it is shorter than 2**k. The intervals are sorted by bucket and then
+    # by start, and those of bucket k that overlap [a, b] start in [a - 2**k + 1, b]: one vectorized binary search
+    # finds that window in every bucket, and of its candidates only the ones that end before `a` are discarded (at
+    # most about as many as the ones kept, as the intervals of a bucket are at least half as long as the longest one
+    # could be). So a long interval only widens the window of its own bucket, and a query costs O(buckets * log n +
+    # hits), whatever the longest interval: about a dozen buckets for intervals of up to a few years. Inserts and
+    # removals keep the arrays sorted without a rebuild: a binary search finds the position, but np.insert/np.delete
+    # copy the arrays, so each one is O(n) (a few microseconds for the thousands of assignments of a save, against
+    # sorting them all again)
+    def __init__(self, keys=(), starts=(), ends=()):
+        # Bulk load, with the starts and ends as days since the epoch
+        keys = _objects(keys)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        positions = _positions(_length_buckets(ends - starts), starts)
+        order = np.argsort(positions, kind='stable')
+
+        self._positions = positions[order]  # Bucket and start, sorted
+        self._ends = ends[order]
+        self._keys = keys[order]
+        self._set_buckets(np.unique(_length_buckets(ends - starts)))
+        self._intervals = {key: (start, end) for key, start, end in zip(keys, starts, ends)}
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def _set_buckets(self, buckets):
+        # The windows of each bucket in the positions, from the start and the end of a query
+        self._buckets = buckets
+        self._window_starts = _positions(buckets, -(2 ** buckets - 1))
+        self._window_ends = _positions(buckets, 0)
+
+    def insert(self, key, start, end):
+        bucket = _length_buckets(end - start)
+        position = _positions(bucket, start)
+        i = np.searchsorted(self._positions, position, side='right')
+        self._positions = np.insert(self._positions, i, position)
+        self._ends = np.insert(self._ends, i, end)
+        self._keys = np.insert(self._keys, i, key)
+        if bucket not in self._buckets:  # Emptied buckets are left: they find no candidates
+            self._set_buckets(np.union1d(self._buckets, [bucket]))
+        self._intervals[key] = (start, end)
+
+    def remove(self, key):
+        start, end = self._intervals.pop(key)
+        position = _positions(_length_buckets(end - start), start)
+        first = np.searchsorted(self._positions, position, side='left')
+        last = np.searchsorted(self._positions, position, side='right')
+        i = first + next(i for i, k in enumerate(self._keys[first:last]) if k == key)
+        self._positions = np.delete(self._positions, i)
+        self._ends = np.delete(self._ends, i)
+        self._keys = np.delete(self._keys, i)
+
+    def overlapping(self, start, end):
+        # Keys of the intervals that overlap [start, end]
+        firsts = self._positions.searchsorted(self._window_starts + start).tolist()
+        lasts = self._positions.searchsorted(self._window_ends + end, side='right').tolist()
+        hits = []
+        for first, last in zip(firsts, lasts):
+            if first < last:
+                hits.extend(self._keys[first:last][self._ends[first:last] >= start].tolist())
+        return hits
+
+
+class GroupedIntervalIndex:
+    # An IntervalIndex of all the intervals plus one per group (e.g. per team member). Thread-safe: saves update it
+    # from the write-behind thread while pages query it
+    def __init__(self, keys, starts, ends, groups):
+        keys = _objects(keys)
+        starts = _days(starts)
+        ends = _days(ends)
+        groups = _objects(groups)
+        valid = _valid(starts, ends)
+        keys, starts, ends, groups = keys[valid], starts[valid], ends[valid], groups[valid]
+
+        self._all = IntervalIndex(keys, starts, ends)
+        self._groups = {}
+        for group in dict.fromkeys(groups):
+            in_group = groups == group
+            self._groups[group] = IntervalIndex(keys[in_group], starts[in_group], ends[in_group])
+        self._group_of = dict(zip(keys, groups))
+        self._lock = threading.Lock()
+
+    def _insert(self, key, start, end, group):
+        if not _valid(start, end):
+            return
+        self._all.insert(key, start, end)
+        self._groups.setdefault(group, IntervalIndex()).insert(key, start, end)
+        self._group_of[key] = group
+
+    def _remove(self, key):
+        if key not in self._group_of:
+            return
+        self._all.remove(key)
+        self._groups[self._group_of.pop(key)].remove(key)
+
+    def upsert(self, keys, starts, ends, groups):
+        with self._lock:
+            for key, start, end, group in zip(keys, _days(starts), _days(ends), groups):
+                self._remove(key)
+                self._insert(key, start, end, group)
+
+    def remove(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def overlapping(self, start, end, group=None):
+        # Keys of the intervals that overlap [start, end], of every group or of one
+        start, end = _days([start, end])
+        with self._lock:
+            index = self._all if group is None else self._groups.get(group)
+            return [] if index is None else index.overlapping(start, end)
+
+
+_NAT = np.datetime64('NaT').astype(np.int64)
+_BUCKET_SPAN = 2 ** 32  # Days of each bucket in the sorted positions, far more than any start
+
+
+def _valid(starts, ends):
+    # Intervals without dates, or ending before they start, overlap nothing and aren't indexed
+    return (starts != _NAT) & (ends != _NAT) & (ends >= starts)
+
+
+def _length_buckets(lengths):
+    # Bits of each length: 0 for 0 days, k for 2**(k - 1) to 2**k - 1 days
+    return np.ceil(np.log2(np.asarray(lengths, dtype=float) + 1)).astype(np.int64)
+
+
+def _positions(buckets, starts):
+    # Sort key of intervals by bucket and then by start
+    return np.asarray(buckets, dtype=np.int64) * _BUCKET_SPAN + starts
+
+
+def _objects(values):
+    values = list(values)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _days(dates):
+    return to_days(list(dates)).astype(np.int64)
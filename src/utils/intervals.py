@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+
+def year_months(year):
+    # The 12 months of a year as datetime64[M]
+    return np.arange(f'{year}-01', f'{year + 1}-01', dtype='datetime64[M]')
+
+
+def to_days(dates):
+    # Dates (Timestamps, strings, datetime64...) to a datetime64[D] array. Missing dates become NaT
+    return np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]').astype('datetime64[D]')
+
+
+def month_overlap_days(starts, ends, months):
+    # How many days of each [start, end] interval (both ends included) fall in each month.
+    # Plain interval arithmetic, broadcasted: (n intervals) x (m months) int array. Rows with missing dates count 0.
+    starts = to_days(starts)[:, None]
+    ends = to_days(ends)[:, None]
+    month_starts = months.astype('datetime64[D]')[None, :]
+    month_ends = (months + 1).astype('datetime64[D]')[None, :] - 1
+
+    first = np.maximum(starts, month_starts)
+    last = np.minimum(ends, month_ends)
+    days = (last - first).astype(np.int64) + 1
+    days[np.isnat(first) | np.isnat(last)] = 0
+
+    return np.clip(days, 0, None)
+
+
+def business_days_overlap(starts, ends, period_starts, period_ends):
+    # How many business days (Mon-Fri) of each [start, end] interval fall in each [period_start, period_end] period.
+    # (n intervals) x (m periods) int array, computed with np.busday_count on broadcasted bounds
+    starts = to_days(starts)[:, None]
+    ends = to_days(ends)[:, None]
+    period_starts = to_days(period_starts)[None, :]
+    period_ends = to_days(period_ends)[None, :]
+
+    first = np.maximum(starts, period_starts)
+    last = np.minimum(ends, period_ends)
+    missing = np.isnat(first) | np.isnat(last)
+    first = np.where(missing, period_starts, first)
+    last = np.where(missing, period_starts, last)
+
+    days = np.busday_count(first, last + 1)
+    days[missing] = 0
+
+    return np.clip(days, 0, None)
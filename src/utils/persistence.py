@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Row-level persistence of the editable tables. Every row has a stable integer `id` (its primary key), so saving an
+# edited table only inserts, updates and deletes the rows that changed since the last persisted snapshot
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'  # Same format pandas used to write the tables
+
+
+_next_ids = {}
+_ids_lock = threading.Lock()
+
+
+def allocate_ids(engine, table, count):
+    # Ids for new rows, handed out by the process before the rows are written. Writes are queued (see utils.writer),
+    # so the ids can't come from the insert itself
+    with _ids_lock:
+        if table not in _next_ids:
+            with engine.connect() as connection:
+                max_id = connection.execute(text(f'SELECT MAX(id) FROM "{table}"')).scalar()
+            _next_ids[table] = (max_id or 0) + 1
+
+        first_id = _next_ids[table]
+        _next_ids[table] += count
+    return list(range(first_id, first_id + count))
+
+
+def _same_values(a, b):
+    return (a == b) | (a.isna() & b.isna())
+
+
+def diff_rows(persisted, edited, columns):
+    # Rows of `edited` without id are new, ids missing from `edited` were deleted and rows with an id are updated
+    # when any of their `columns` differs from the persisted one
+    edited = edited.copy()
+    edited['id'] = pd.to_numeric(edited['id'], errors='coerce')
+
+    inserted = edited.loc[edited['id'].isna(), columns]
+    deleted_ids = sorted(set(persisted['id']) - set(edited['id'].dropna()))
+
+    kept = edited.dropna(subset=['id']).set_index('id')[columns]
+    before = persisted.set_index('id').reindex(kept.index)[columns]
+    changed = ~_same_values(kept.astype(object), before.astype(object)).all(axis=1)
+    updated = kept[changed].reset_index()
+
+    return inserted, updated, deleted_ids
+
+
+def has_changes(inserted, updated, deleted_ids):
+    return not inserted.empty or not updated.empty or bool(deleted_ids)
+
+
+def _to_sql_value(value):
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return None
+    if isinstance(value, np.datetime64) or hasattr(value, 'strftime'):  # Timestamps, or dates from the date editors
+        return pd.Timestamp(value).strftime(DATETIME_FORMAT)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _records(df, columns):
+    return [{column: _to_sql_value(row[column]) for column in columns} for _, row in df.iterrows()]
+
+
+def save_rows(connection, table, columns, inserted, updated, deleted_ids):
+    # Apply a diff to the table, in the caller's transaction
+    if deleted_ids:
+        connection.execute(
+            text(f'DELETE FROM "{table}" WHERE id = :id'),
+            [{'id': int(row_id)} for row_id in deleted_ids]
+        )
+
+    if not updated.empty:
+        assignments = ', '.join(f'"{column}" = :{column}' for column in columns)
+        connection.execute(
+            text(f'UPDATE "{table}" SET {assignments} WHERE id = :id'),
+            [
+                {**record, 'id': int(row_id)}
+                for record, row_id in zip(_records(updated, columns), updated['id'])
+            ]
+        )
+
+    if not inserted.empty:
+        insert_columns = ['id'] + columns if 'id' in inserted.columns else columns
+        names = ', '.join(f'"{column}"' for column in insert_columns)
+        values = ', '.join(f':{column}' for column in insert_columns)
+        connection.execute(
+            text(f'INSERT INTO "{table}" ({names}) VALUES ({values})'), _records(inserted, insert_columns)
+        )
@@ -0,0 +1,42 @@
+import os
+from datetime import date
+
+import numpy as np
+
+from .calendar_dimension import build_calendar_range
+
+# Rolling planning horizon of the weekly views: the current week, WEEKS_BACK weeks before it and WEEKS_FORWARD weeks
+# after it. The weekly engines only compute these weeks, however long the stored history is
+WEEKS_BACK = int(os.environ.get('PLANNING_WEEKS_BACK', 4))
+WEEKS_FORWARD = int(os.environ.get('PLANNING_WEEKS_FORWARD', 26))
+
+MAX_WEEKS = 52  # Longest range of the weekly views and endpoints: weeks are labelled with their ISO week number
+
+# Checked at startup, as the API checks the ranges it is asked for: a wrong horizon would fail (or repeat week
+# labels) on the first weekly page instead
+if WEEKS_BACK < 0 or WEEKS_FORWARD < 0:
+    raise ValueError("PLANNING_WEEKS_BACK and PLANNING_WEEKS_FORWARD can't be negative")
+if WEEKS_BACK + 1 + WEEKS_FORWARD > MAX_WEEKS:
+    raise ValueError(
+        f"The planning horizon (PLANNING_WEEKS_BACK + 1 + PLANNING_WEEKS_FORWARD weeks) can't span more than "
+        f"{MAX_WEEKS} weeks"
+    )
+
+
+def horizon_bounds(day=None):
+    # First and last day (Monday and Sunday) of the horizon around `day`, as 'YYYY-MM-DD'. Hashable, so they can be
+    # the arguments of the derived engines
+    day = np.datetime64(day or date.today(), 'D')
+    monday = day - (day.astype(int) + 3) % 7  # Weekday with Monday = 0, as 1970-01-01 was a Thursday
+    start = monday - 7 * WEEKS_BACK
+    end = monday + 7 * (WEEKS_FORWARD + 1) - 1
+    return str(start), str(end)
+
+
+def horizon_calendar(day=None):
+    return build_calendar_range(*horizon_bounds(day))
+
+
+def planning_year(day=None):
+    # Year of the monthly views (their tables have one column per month name)
+    return (day or date.today()).year
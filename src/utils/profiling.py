@@ -0,0 +1,177 @@
+import collections
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+# Timings of the page reruns, for the Diagnóstico page and a rotating JSON log. Each rerun records a tree of timers
+# (page, compute, cache, sql, render, calendar); the time of each timer minus its children (self time) is added to
+# its category, so the breakdown of a rerun adds up to its total.
+# Disabled unless PLANNING_PROFILING=1: timer() then returns a shared no-op context and timed() the function itself
+
+ENABLED = os.environ.get('PLANNING_PROFILING') == '1'
+LOG_PATH = os.environ.get('PLANNING_PROFILING_LOG', "logs/timings.jsonl")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+SLOW_QUERY = 0.05  # Seconds. Slower queries are kept in the slow query list
+RECENT_RUNS = 200
+SLOW_QUERIES = 100
+
+CATEGORIES = ['page', 'compute', 'cache', 'sql', 'render', 'calendar']
+
+_runs = collections.deque(maxlen=RECENT_RUNS)  # Most recent reruns, process-wide
+_slow_queries = collections.deque(maxlen=SLOW_QUERIES)
+_lock = threading.Lock()
+_local = threading.local()  # Stack of open timers of the current thread
+_logger = None
+_null_timer = contextlib.nullcontext()
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(LOG_PATH) or '.', exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('planning.timings')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+class _Timer:
+    def __init__(self, category, name):
+        self.category = category
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.depth = len(stack)
+        self.children = 0.0
+        self.start = time.perf_counter()
+        stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += duration
+
+        run = getattr(_local, 'run', None)
+        if run is not None:
+            run['timings'].append({
+                'category': self.category,
+                'name': self.name,
+                'depth': self.depth,
+                'offset': self.start - run['_start'],
+                'duration': duration,
+                'self': duration - self.children,
+            })
+        if self.category == 'sql' and duration >= SLOW_QUERY:
+            with _lock:
+                _slow_queries.append({
+                    'time': datetime.now().isoformat(timespec='seconds'),
+                    'page': run['page'] if run is not None else None,
+                    'statement': self.name,
+                    'duration': duration,
+                })
+        return False
+
+
+def timer(category, name):
+    # Context manager timing a block of the current rerun
+    if not ENABLED:
+        return _null_timer
+    return _Timer(category, name)
+
+
+def timed(category, name=None):
+    # Decorator timing every call of a function. Without profiling, the function is returned as it is
+    def decorator(func):
+        if not ENABLED:
+            return func
+        label = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(category, label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def rerun(page):
+    # Record a rerun of a page: its timers, their breakdown by category, and a line in the JSON log
+    if not ENABLED:
+        yield
+        return
+
+    run = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'page': page,
+        'timings': [],
+        '_start': time.perf_counter(),
+    }
+    _local.run = run
+    try:
+        with _Timer('page', page):
+            yield
+    finally:
+        _local.run = None
+        run['total'] = time.perf_counter() - run.pop('_start')
+        run['breakdown'] = {category: 0.0 for category in CATEGORIES}
+        for timing in run['timings']:
+            run['breakdown'][timing['category']] = run['breakdown'].get(timing['category'], 0.0) + timing['self']
+        with _lock:
+            _runs.append(run)
+        _get_logger().info(json.dumps(run, ensure_ascii=False))
+
+
+def recent_runs():
+    with _lock:
+        return list(_runs)
+
+
+def slow_queries():
+    with _lock:
+        return list(_slow_queries)
+
+
+def instrument_engine(engine):
+    # Time every statement run by the engine
+    if not ENABLED:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        timer = _Timer('sql', ' '.join(statement.split()))
+        connection.info.setdefault('timers', []).append(timer)
+        timer.__enter__()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info['timers'].pop().__exit__(None, None, None)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('timers'):
+            connection.info['timers'].pop().__exit__(None, None, None)
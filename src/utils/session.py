@@ -0,0 +1,20 @@
+import streamlit as st
+
+# Sessions share the process-wide snapshot of each table (the cached read_* functions). Their unsaved edits are the
+# data editor's own delta (edited, added and deleted rows, in the editor's widget state), applied over the snapshot
+
+
+def has_pending_edits(editor_key):
+    state = st.session_state.get(editor_key)
+    if not state:
+        return False
+    return bool(state.get('edited_rows') or state.get('added_rows') or state.get('deleted_rows'))
+
+
+def session_table(key, editor_key, write_key, read):
+    # The table the session's editor works on, in st.session_state[key]. It follows the shared snapshot, except while
+    # the session has unsaved edits (they are relative to the rows it was showing) or a save in flight (the snapshot
+    # doesn't have it yet)
+    if key not in st.session_state or not (has_pending_edits(editor_key) or write_key in st.session_state):
+        st.session_state[key] = read()
+    return st.session_state[key]
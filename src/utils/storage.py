@@ -0,0 +1,195 @@
+import os
+import threading
+
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+
+from .boost_grid import cell_records, grid_to_cells
+from .profiling import instrument_engine
+
+# Single SQLite store for all the tables, shared by every page and session through one pooled engine
+DATABASE_PATH = os.environ.get('PLANNING_DATABASE', "data/planning.db")
+DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+
+engine = create_engine(DATABASE_URL, pool_size=5, max_overflow=10, connect_args={'check_same_thread': False})
+instrument_engine(engine)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer and vice versa
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+        id INTEGER PRIMARY KEY,
+        Proyecto TEXT,
+        Tipo TEXT,
+        Inicio DATETIME,
+        Fin DATETIME,
+        Equipo TEXT,
+        HorasMes NUMBER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_projects_equipo ON projects (Equipo)",
+    "CREATE INDEX IF NOT EXISTS idx_projects_dates ON projects (Inicio, Fin)",
+    """
+    CREATE TABLE IF NOT EXISTS team_members (
+        id INTEGER PRIMARY KEY,
+        Nombre TEXT,
+        Rol TEXT,
+        Grado TEXT,
+        Enero NUMBER,
+        Febrero NUMBER,
+        Marzo NUMBER,
+        Abril NUMBER,
+        Mayo NUMBER,
+        Junio NUMBER,
+        Julio NUMBER,
+        Agosto NUMBER,
+        Setiembre NUMBER,
+        Octubre NUMBER,
+        Noviembre NUMBER,
+        Diciembre NUMBER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_team_members_nombre ON team_members (Nombre)",
+    """
+    CREATE TABLE IF NOT EXISTS boost_hours (
+        member TEXT NOT NULL,
+        week_start TEXT NOT NULL,
+        hours REAL,
+        label TEXT,
+        PRIMARY KEY (member, week_start)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_boost_hours_week ON boost_hours (week_start)",
+    """
+    CREATE TABLE IF NOT EXISTS holidays (
+        id TEXT,
+        calendar_id TEXT,
+        name TEXT,
+        start TEXT,
+        "end" TEXT,
+        status TEXT,
+        PRIMARY KEY (calendar_id, id)
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_holidays_dates ON holidays (calendar_id, start, "end")',
+    """
+    CREATE TABLE IF NOT EXISTS revisions (
+        name TEXT PRIMARY KEY,
+        revision INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS holidays_sync (
+        calendar_id TEXT PRIMARY KEY,
+        sync_token TEXT,
+        synced_at TEXT
+    )
+    """,
+]
+
+# Databases used before the single store. Their tables are copied once, when the new table is still empty
+LEGACY_DATABASES = {
+    'projects': "data/projects.db",
+    'team_members': "data/team_members.db",
+    'holidays': "data/holidays.db",
+    'holidays_sync': "data/holidays.db",
+}
+LEGACY_BOOST_DATABASE = "data/boost_assignation.db"
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def _table_columns(connection, table, schema='main'):
+    return [row[1] for row in connection.execute(text(f'PRAGMA "{schema}".table_info("{table}")'))]
+
+
+def _import_legacy_table(connection, table, path):
+    if not os.path.exists(path):
+        return
+
+    connection.execute(text("ATTACH DATABASE :path AS legacy"), {'path': path})
+    try:
+        legacy_columns = _table_columns(connection, table, 'legacy')
+        columns = _table_columns(connection, table)
+        if not legacy_columns or not columns:
+            return
+
+        if connection.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar():
+            return
+
+        names = ', '.join(f'"{column}"' for column in columns if column in legacy_columns)
+        connection.execute(text(f'INSERT INTO "{table}" ({names}) SELECT {names} FROM legacy."{table}"'))
+    finally:
+        connection.commit()
+        connection.execute(text("DETACH DATABASE legacy"))
+
+
+def _read_legacy_boost_grid(connection):
+    # The Boost grid used to be saved as a wide table: one row per member plus the Inicio/Fin/_Inicio header rows,
+    # one TEXT column per week. It may still be in the store (imported by an earlier version) or in its own database
+    if _table_columns(connection, 'boost_assignation'):
+        return pd.read_sql(text('SELECT * FROM boost_assignation'), connection)
+
+    path = LEGACY_BOOST_DATABASE
+    if not os.path.exists(path):
+        return None
+    connection.execute(text("ATTACH DATABASE :path AS legacy"), {'path': path})
+    try:
+        if not _table_columns(connection, 'boost_assignation', 'legacy'):
+            return None
+        return pd.read_sql(text('SELECT * FROM legacy.boost_assignation'), connection)
+    finally:
+        connection.commit()
+        connection.execute(text("DETACH DATABASE legacy"))
+
+
+def _import_legacy_boost_grid(connection):
+    # Unpivot the wide grid into boost_hours, one row per non-empty cell, the first time the store is opened
+    if connection.execute(text('SELECT COUNT(*) FROM boost_hours')).scalar():
+        return
+
+    grid = _read_legacy_boost_grid(connection)
+    if grid is None or '_Inicio' not in set(grid['Semana']):
+        return
+
+    records = cell_records(grid_to_cells(grid))
+    if records:
+        connection.execute(
+            text(
+                'INSERT OR IGNORE INTO boost_hours (member, week_start, hours, label) '
+                'VALUES (:member, :week_start, :hours, :label)'
+            ),
+            records
+        )
+    connection.execute(text('DROP TABLE IF EXISTS boost_assignation'))
+    connection.commit()
+
+
+def init_storage():
+    # Create the schema and import the legacy databases. Runs once per process, at startup
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+
+        os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+        with engine.connect() as connection:
+            for statement in SCHEMA:
+                connection.execute(text(statement))
+            connection.commit()
+
+            for table, path in LEGACY_DATABASES.items():
+                _import_legacy_table(connection, table, path)
+            _import_legacy_boost_grid(connection)
+
+        _initialized = True
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+# Styles of whole tables computed in one vectorized pass instead of a Python callback per row or cell. The pages build
+# the colors of the cells with these helpers, turn them into a frame of CSS declarations with css_frame, cache that
+# frame with the data it styles and hand it to the Styler with styled()
+
+BANDS = ('#ffffff', '#f5f5f5')
+
+
+def row_bands(n_rows, colors=BANDS):
+    # Background of each row (a column vector), alternating row by row
+    return np.asarray(colors, dtype=object)[np.arange(n_rows) % len(colors)].reshape(-1, 1)
+
+
+def group_bands(keys, colors=BANDS):
+    # Background of each row (a column vector), alternating each time the key changes from one row to the next
+    keys = pd.Series(np.asarray(keys))
+    groups = (keys != keys.shift()).cumsum().to_numpy() - 1
+    return np.asarray(colors, dtype=object)[groups % len(colors)].reshape(-1, 1)
+
+
+def numeric_values(df):
+    # Values of the table as floats, NaN where they aren't numbers (names, dates, labels)
+    values = pd.to_numeric(pd.Series(df.to_numpy().ravel()), errors='coerce')
+    return values.to_numpy(dtype=float).reshape(df.shape)
+
+
+def _declarations(prop, colors, shape):
+    colors = np.broadcast_to(np.asarray(colors, dtype=object), shape)
+    return np.where(colors == '', '', f'{prop}: ' + colors)
+
+
+def css_frame(df, background, color=None):
+    # CSS of each cell of df. background and color are CSS colors of the cells, or anything broadcasting to the shape
+    # of df (a color per row, per column or for the whole table), '' for none
+    css = _declarations('background-color', background, df.shape)
+    if color is not None:
+        text_color = _declarations('color', color, df.shape)
+        css = np.where((css != '') & (text_color != ''), css + '; ' + text_color, css + text_color)
+    return pd.DataFrame(css, index=df.index, columns=df.columns)
+
+
+def styled(df, css):
+    # Styler of df with the CSS of css_frame
+    return df.style.apply(lambda _: css, axis=None)
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .intervals import to_days
+
+WEEKMASK = '1111100'  # Monday to Friday
+
+
+@dataclass(frozen=True)
+class WorkCalendar:
+    # Working days of each team member in a range of whole months: weekends, national holidays and the member's leave
+    # are off. Row i is the calendar of members[i] and the last row the one of anyone else (weekends and national
+    # holidays only). Every array is read-only
+    start: np.datetime64  # First day of the range (first day of its first month)
+    end: np.datetime64  # Last day of the range (last day of its last month)
+    members: tuple
+    months: np.ndarray  # datetime64[M], every month of the range
+    month_working_days: np.ndarray  # Weekdays of each month that aren't national holidays
+    cumulative: np.ndarray  # (members + 1) x (days + 1) working days before each day of the range, and in all of it
+
+
+def build_work_calendar(start, end, members, holidays, leaves):
+    # Calendar of the whole months from start to end ('YYYY-MM-DD'). holidays: dates of the national holidays.
+    # leaves: frame with the member, start and end (both included) of each leave; other members are ignored
+    start = np.datetime64(start, 'M').astype('datetime64[D]')
+    end = (np.datetime64(end, 'M') + 1).astype('datetime64[D]') - 1
+    members = tuple(dict.fromkeys(members))
+    days = np.arange(start, end + 1)
+    months = np.arange(start.astype('datetime64[M]'), end.astype('datetime64[M]') + 1)
+
+    holidays = to_days(holidays)
+    national = np.is_busday(days, weekmask=WEEKMASK, holidays=holidays[~np.isnat(holidays)])
+    month_working_days = np.add.reduceat(national.astype(int), (months.astype('datetime64[D]') - start).astype(int))
+
+    # Leave days of each member, marked with a difference array: +1 on its first day, -1 after its last one
+    rows = pd.Index(members).get_indexer(leaves['member'])
+    first = to_days(leaves['start'])
+    last = to_days(leaves['end'])
+    valid = (rows >= 0) & ~np.isnat(first) & ~np.isnat(last) & (first <= last) & (first <= end) & (last >= start)
+    first = (np.maximum(first[valid], start) - start).astype(int)
+    last = (np.minimum(last[valid], end) - start).astype(int)
+    on_leave = np.zeros((len(members) + 1, len(days) + 1), dtype=int)
+    np.add.at(on_leave, (rows[valid], first), 1)
+    np.add.at(on_leave, (rows[valid], last + 1), -1)
+
+    working = national[None, :] & (np.cumsum(on_leave, axis=1)[:, :-1] == 0)
+    cumulative = np.zeros((len(members) + 1, len(days) + 1), dtype=int)
+    np.cumsum(working, axis=1, out=cumulative[:, 1:])
+
+    for array in (months, month_working_days, cumulative):
+        array.flags.writeable = False
+    return WorkCalendar(
+        start=start,
+        end=end,
+        members=members,
+        months=months,
+        month_working_days=month_working_days,
+        cumulative=cumulative,
+    )
+
+
+def member_rows(calendar, names):
+    # Rows of the calendar of each team member. Names that aren't team members get the calendar of anyone else
+    rows = pd.Index(calendar.members).get_indexer(names)
+    return np.where(rows >= 0, rows, len(calendar.members))
+
+
+def working_days(calendar, rows, starts, ends):
+    # Working days from start to end (both included, datetime64[D], within the calendar) of the members of `rows`.
+    # Vectorized: the arguments broadcast together, each count is two lookups. Missing dates count 0
+    first = np.clip((starts - calendar.start).astype(np.int64), 0, calendar.cumulative.shape[1] - 1)
+    last = np.clip((ends - calendar.start).astype(np.int64) + 1, 0, calendar.cumulative.shape[1] - 1)
+    days = calendar.cumulative[rows, last] - calendar.cumulative[rows, first]
+    return np.where(np.isnat(starts) | np.isnat(ends) | (last < first), 0, days)
+
+
+def load_fraction(calendar, rows, starts, ends, months):
+    # Fraction of a monthly load done from start to end, within the month of index `months`: working days of the
+    # member over the working days of the month. 0 in months without working days
+    month_working_days = calendar.month_working_days[months]
+    return np.divide(
+        working_days(calendar, rows, starts, ends), month_working_days,
+        out=np.zeros(np.broadcast_shapes(np.shape(rows), np.shape(starts), np.shape(ends), np.shape(months))),
+        where=month_working_days != 0
+    )
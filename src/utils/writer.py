@@ -0,0 +1,140 @@
+import atexit
+import queue
+import threading
+import time
+
+import streamlit as st
+
+# Write-behind queue for the editors' saves. Writes run in a background thread, so the script thread never waits on
+# SQLite. Writes submitted close together are coalesced into a single transaction per database
+
+COALESCE_DELAY = 0.2  # Seconds the writer waits for more writes before committing
+POLL_INTERVAL = 0.5  # Seconds between checks of a pending write, in a fragment that doesn't rerun the page
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class WriteTicket:
+    # Completion of a submitted write. Kept in the session state until the page reports it
+    def __init__(self):
+        self._done = threading.Event()
+        self.error = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def finish(self, error=None):
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+def _run():
+    while True:
+        jobs = [_queue.get()]
+        time.sleep(COALESCE_DELAY)
+        while True:
+            try:
+                jobs.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            _commit(jobs)
+        except Exception as e:
+            # Whatever happens to a batch, its tickets finish and the writer goes on with the next one
+            for _, _, _, ticket in jobs:
+                if not ticket.done:
+                    ticket.finish(e)
+        finally:
+            for _ in jobs:
+                _queue.task_done()
+
+
+def _commit(jobs):
+    # One transaction per database, keeping the order of the writes
+    engines = []
+    for engine, _, _, _ in jobs:
+        if engine not in engines:
+            engines.append(engine)
+
+    for engine in engines:
+        engine_jobs = [job for job in jobs if job[0] is engine]
+        try:
+            with engine.begin() as connection:
+                for _, write, _, _ in engine_jobs:
+                    write(connection)
+            error = None
+        except Exception as e:
+            error = e
+
+        for _, _, on_commit, ticket in engine_jobs:
+            job_error = error
+            if job_error is None and on_commit is not None:
+                try:
+                    on_commit()
+                except Exception as e:
+                    # Committed, but e.g. the revision wasn't bumped: reported, and the writer goes on
+                    job_error = e
+            ticket.finish(job_error)
+
+
+def submit_write(engine, write, on_commit=None):
+    # Queue write(connection) to run in a transaction of `engine`. on_commit runs after the commit (e.g. to bump the
+    # revision of the written table)
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name='write-behind', daemon=True)
+            _worker.start()
+
+    ticket = WriteTicket()
+    _queue.put((engine, write, on_commit, ticket))
+    return ticket
+
+
+def flush():
+    # Wait until every queued write is committed
+    if _worker is not None:
+        _queue.join()
+
+
+atexit.register(flush)
+
+
+def _show_write_result(key, ticket):
+    del st.session_state[key]
+    if ticket.error is not None:
+        st.toast(f"Error saving changes: {ticket.error}", icon="❌")
+        return False
+
+    st.toast('Changes saved successfully!', icon="✅")
+    return True
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def _poll_write(key):
+    ticket = st.session_state.get(key)
+    if ticket is None or not ticket.done:
+        return
+    if ticket.error is None:
+        _show_write_result(key, ticket)
+    else:
+        st.rerun()  # Failed writes are handled by the page
+
+
+def report_write(key):
+    # Show the result of the write whose ticket is in st.session_state[key] once it finishes.
+    # Returns False if the write failed, so the page can reload the saved data
+    ticket = st.session_state.get(key)
+    if ticket is None:
+        return True
+    if not ticket.done:
+        _poll_write(key)
+        return True
+    return _show_write_result(key, ticket)
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Correctness tests, without timings (those are in benchmarks/). The engines read the store of utils.storage, so the
+# synthetic one has to be configured before they are imported
+DATA_DIR = tempfile.mkdtemp(prefix='planning-tests-')
+os.environ['PLANNING_DATABASE'] = os.path.join(DATA_DIR, 'planning.db')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generate_data import generate
+
+# A smaller store than the benchmarks one: the tests recompute the engines many times
+MEMBERS = 20
+ASSIGNMENTS = 400
+YEARS = 2
+FIRST_YEAR = 2025
+BOOST_DENSITY = 0.3
+SEED = 0
+
+
+@pytest.fixture(scope='session')
+def synthetic_data():
+    return generate(
+        os.environ['PLANNING_DATABASE'], MEMBERS, ASSIGNMENTS, YEARS, FIRST_YEAR, BOOST_DENSITY, SEED
+    )
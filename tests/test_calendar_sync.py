@@ -0,0 +1,116 @@
+import datetime
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from utils.storage import engine
+from pages import holidays
+from pages.holidays import sync_calendars, sync_holidays
+
+from conftest import FIRST_YEAR
+from fake_calendar import FakeCalendarServer, leave_events
+
+CALENDARS = ['oficina-a', 'oficina-b', 'oficina-c', 'oficina-d']
+EVENTS = 2000  # Per calendar: 2 pages of 1000
+LATENCY = 0.1  # Seconds per page
+
+
+@pytest.fixture(scope='module')
+def calendar_server(synthetic_data):
+    # The real client (fetch_google_events_page) asks the local stand-in server
+    team_members, _, _ = synthetic_data
+    server = FakeCalendarServer(latency=LATENCY).start()
+    for seed, calendar_id in enumerate(CALENDARS):
+        server.put_events(
+            calendar_id, leave_events(f'{calendar_id}-', EVENTS, team_members['Nombre'], FIRST_YEAR, seed=seed)
+        )
+    endpoint = holidays.CALENDAR_ENDPOINT
+    holidays.CALENDAR_ENDPOINT = server.endpoint
+    yield server
+    holidays.CALENDAR_ENDPOINT = endpoint
+    server.stop()
+
+
+def forget_calendars(calendar_ids=CALENDARS):
+    # The next sync of the calendars is a full one
+    with engine.begin() as connection:
+        for calendar_id in calendar_ids:
+            connection.execute(text("DELETE FROM holidays WHERE calendar_id = :id"), {'id': calendar_id})
+            connection.execute(text("DELETE FROM holidays_sync WHERE calendar_id = :id"), {'id': calendar_id})
+
+
+def stored_events(calendar_id):
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT COUNT(*) FROM holidays WHERE calendar_id = :id"), {'id': calendar_id}
+        ).scalar()
+
+
+def test_sync_calendars_partial(calendar_server):
+    # A slow calendar doesn't hold back the others: it is reported and goes on syncing in the background
+    forget_calendars()
+    calendar_server.latency = {'oficina-d': 2.0}
+    try:
+        errors = sync_calendars(CALENDARS, timeout=1.0)
+        assert list(errors) == ['oficina-d']
+        assert [stored_events(calendar_id) for calendar_id in CALENDARS[:-1]] == [EVENTS] * (len(CALENDARS) - 1)
+
+        # Asked again while it is still syncing: the running sync is awaited, not started again
+        assert not sync_calendars(CALENDARS, timeout=10.0)
+        assert stored_events('oficina-d') == EVENTS
+    finally:
+        calendar_server.latency = LATENCY
+
+
+def test_sync_calendars_errors(calendar_server):
+    # Errors are reported per calendar, the other calendars are stored
+    forget_calendars()
+    errors = sync_calendars(CALENDARS[:1] + ['no-such-calendar'])
+    assert list(errors) == ['no-such-calendar']
+    assert errors['no-such-calendar'].resp.status == 404
+    assert stored_events(CALENDARS[0]) == EVENTS
+
+
+def test_incremental_sync(calendar_server):
+    # Changes after a full sync: new and cancelled events, and a full sync again when the sync token expires
+    calendar_id = CALENDARS[0]
+    forget_calendars([calendar_id])
+    sync_holidays(calendar_id=calendar_id)
+
+    calendar_server.cancel_events(calendar_id, [f'{calendar_id}-{i}' for i in range(10)])
+    calendar_server.put_events(calendar_id, leave_events(f'{calendar_id}-new-', 5, ['Alguien'], FIRST_YEAR))
+    sync_holidays(calendar_id=calendar_id, max_age=datetime.timedelta(0))
+    assert stored_events(calendar_id) == EVENTS - 10 + 5
+
+    with engine.begin() as connection:
+        connection.execute(
+            text("UPDATE holidays_sync SET sync_token = 'expired' WHERE calendar_id = :id"), {'id': calendar_id}
+        )
+        connection.execute(
+            text("DELETE FROM holidays WHERE calendar_id = :id AND id LIKE '%-new-%'"), {'id': calendar_id}
+        )
+    sync_holidays(calendar_id=calendar_id, max_age=datetime.timedelta(0))
+    assert stored_events(calendar_id) == EVENTS - 10 + 5
+
+
+def test_sync_work_calendars_without_credentials(synthetic_data, tmp_path, monkeypatch):
+    # Without token.json the syncs of the reruns and requests are skipped and reported, and the syncs that still run
+    # without credentials fail: none of them starts the authorization flow, which waits for a login in a browser
+    def authorization_flow(*args, **kwargs):
+        raise AssertionError("the authorization flow was started")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(holidays, 'CALENDAR_ENDPOINT', None)
+    monkeypatch.setattr(holidays.InstalledAppFlow, 'from_client_secrets_file', authorization_flow)
+    monkeypatch.setattr(holidays, '_work_calendars_checked', None)
+    monkeypatch.setattr(holidays, '_work_calendars_skipped', None)
+    monkeypatch.setattr(holidays, '_services', threading.local())
+
+    assert holidays.sync_work_calendars()
+    assert holidays.sync_work_calendars()  # Until the next check, the same report
+
+    forget_calendars(['oficina-e'])
+    errors = sync_calendars(['oficina-e'], holidays.fetch_work_calendar_page)
+    assert isinstance(errors['oficina-e'], holidays.NoCredentials)
+    assert stored_events('oficina-e') == 0
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import cache, writer
+from pages.assignation_projects import monthly_assignation
+from pages.boost import compute_weekly_assignation, compute_weekly_free_hours
+from pages.metrics import monthly_utilization
+from pages.projects import read_projects, save_projects
+
+from conftest import FIRST_YEAR
+
+STEPS = 25
+HOURS = [8, 20, 40, 80, 160]
+
+# The incremental updates of the engines (registered with func.incremental('projects')) against full recomputes:
+# random saves of the projects go through the write-behind queue, as in the app, and after each one the updated
+# frames must equal the ones computed from the store. Each case is a derived function and its arguments
+WEEKLY_RANGES = [(f'{FIRST_YEAR}-01-01', f'{FIRST_YEAR}-12-31'), (f'{FIRST_YEAR}-03-03', f'{FIRST_YEAR}-09-28')]
+ENGINE_CASES = [
+    *[(monthly_assignation, (year,)) for year in [FIRST_YEAR, FIRST_YEAR + 1]],
+    *[(compute_weekly_assignation, weekly_range) for weekly_range in WEEKLY_RANGES],
+    *[(compute_weekly_free_hours, weekly_range) for weekly_range in WEEKLY_RANGES],
+]
+UTILIZATION_CASES = [(monthly_utilization, (year,)) for year in [FIRST_YEAR, FIRST_YEAR + 1]]
+
+
+def random_edit(rng, projects, names):
+    # The projects table after one edit of the editor: new hours and end, another team member or Tipo (or none), a
+    # new row or a deleted one
+    projects = projects.copy()
+    i = int(rng.integers(len(projects)))
+    kind = rng.choice(['update', 'member', 'type', 'insert', 'delete'])
+    if kind == 'update':
+        projects.loc[i, 'HorasMes'] = int(rng.choice(HOURS))
+        projects.loc[i, 'Fin'] = projects.loc[i, 'Inicio'] + pd.Timedelta(days=int(rng.integers(1, 300)))
+    elif kind == 'member':
+        projects.loc[i, 'Equipo'] = rng.choice(names)
+    elif kind == 'type':
+        projects.loc[i, 'Tipo'] = [None, 'Facturable', 'Interno'][int(rng.integers(3))]
+    elif kind == 'insert':
+        row = projects.iloc[[i]].copy()
+        row['id'] = np.nan
+        row['Inicio'] = pd.Timestamp(f'{FIRST_YEAR}-01-01') + pd.Timedelta(days=int(rng.integers(0, 500)))
+        row['Fin'] = row['Inicio'] + pd.Timedelta(days=int(rng.integers(1, 200)))
+        projects = pd.concat([projects, row], ignore_index=True)
+    else:
+        projects = projects.drop(index=i).reset_index(drop=True)
+    return projects
+
+
+def cached_is_current(func, args):
+    # Whether the cached value of func(*args) was updated to the current revisions (not left stale for a recompute)
+    entry = cache._derived.get((func.__module__, func.__qualname__, args, ()))
+    revisions = tuple(cache.get_revision(table) for table in ['projects', 'team_members', 'holidays'])
+    return entry is not None and entry[0] == revisions
+
+
+def values(cases):
+    result = []
+    for func, args in cases:
+        value = func(*args)
+        result.extend(value if isinstance(value, tuple) else [value])
+    return result
+
+
+def assert_incremental_matches_full(cases, names, seed):
+    rng = np.random.default_rng(seed)
+    cache.refresh_revisions()
+    for step in range(STEPS):
+        values(cases)  # Cached at the current revisions, so the next save updates them
+
+        # One or two saves, coalesced by the writer when they are queued together
+        snapshot = read_projects()
+        tickets = []
+        for _ in range(int(rng.integers(1, 3))):
+            ticket, snapshot = save_projects(random_edit(rng, snapshot, names), snapshot)
+            tickets.append(ticket)
+        writer.flush()
+        assert all(ticket is None or ticket.error is None for ticket in tickets)
+        assert all(cached_is_current(func, args) for func, args in cases)
+        incremental = values(cases)
+
+        # Every table at a new revision: computed again from the store
+        for table in ['projects', 'team_members', 'holidays']:
+            cache.bump_revision(table)
+        full = values(cases)
+
+        for updated, computed in zip(incremental, full):
+            pd.testing.assert_frame_equal(updated, computed, obj=f'step {step}')
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_engines_incremental(synthetic_data, seed):
+    team_members, _, _ = synthetic_data
+    assert_incremental_matches_full(ENGINE_CASES, team_members['Nombre'].tolist(), seed)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_monthly_utilization_incremental(synthetic_data, seed):
+    # The rollup by team member and Tipo of Métricas: hours moved between its rows, new rows and rows left empty
+    team_members, _, _ = synthetic_data
+    assert_incremental_matches_full(UTILIZATION_CASES, team_members['Nombre'].tolist(), seed)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from utils.interval_index import GroupedIntervalIndex, IntervalIndex
+
+DAYS = 400  # Days the random intervals start in
+QUERIES = 300
+LONG = 10_000  # Key of an interval longer than the others
+
+
+def random_intervals(rng, count, first_key=0):
+    starts = rng.integers(0, DAYS, count)
+    ends = starts + rng.integers(0, 60, count)
+    return list(range(first_key, first_key + count)), starts, ends
+
+
+def brute_force(intervals, start, end):
+    # Keys of the intervals (key -> (start, end)) that overlap [start, end], both closed
+    return sorted(key for key, (a, b) in intervals.items() if a <= end and b >= start)
+
+
+def assert_matches(index, intervals, rng):
+    assert len(index) == len(intervals)
+    for _ in range(QUERIES):
+        start = int(rng.integers(-70, DAYS + 70))
+        end = start + int(rng.integers(0, 90))
+        assert sorted(index.overlapping(start, end)) == brute_force(intervals, start, end)
+
+
+def test_overlapping():
+    rng = np.random.default_rng(0)
+    keys, starts, ends = random_intervals(rng, 500)
+    index = IntervalIndex(keys, starts, ends)
+    assert_matches(index, dict(zip(keys, zip(starts, ends))), rng)
+
+
+def test_overlapping_after_changes():
+    # Inserts and removals, including intervals that start on the same day and the longest interval
+    rng = np.random.default_rng(1)
+    keys, starts, ends = random_intervals(rng, 300)
+    index = IntervalIndex(keys, starts, ends)
+    intervals = dict(zip(keys, zip(starts, ends)))
+
+    for key, start, end in zip(*random_intervals(rng, 200, first_key=300)):
+        index.insert(key, start, end)
+        intervals[key] = (start, end)
+    index.insert(LONG, 10, DAYS + 200)
+    intervals[LONG] = (10, DAYS + 200)
+    assert_matches(index, intervals, rng)
+
+    for key in [*rng.choice(list(range(500)), 250, replace=False).tolist(), LONG]:
+        index.remove(key)
+        del intervals[key]
+    assert_matches(index, intervals, rng)
+
+
+def test_mixed_lengths():
+    # Intervals from a day to years long (in buckets by length), a few of them much longer than the queries
+    rng = np.random.default_rng(3)
+    starts = rng.integers(-2000, DAYS, 400)
+    ends = starts + (2 ** rng.uniform(0, 12, 400)).astype(int) - 1
+    keys = list(range(400))
+    index = IntervalIndex(keys, starts, ends)
+    intervals = dict(zip(keys, zip(starts, ends)))
+    assert_matches(index, intervals, rng)
+
+    for key in rng.choice(keys, 200, replace=False).tolist():
+        index.remove(key)
+        del intervals[key]
+    for key, start, length in zip(range(400, 500), rng.integers(0, DAYS, 100), rng.integers(0, 3000, 100)):
+        index.insert(key, start, start + length)
+        intervals[key] = (start, start + length)
+    assert_matches(index, intervals, rng)
+
+
+def test_touching_boundaries():
+    # Closed intervals: sharing a single day is overlapping
+    index = IntervalIndex(['a', 'b', 'c'], [10, 20, 21], [20, 20, 30])
+    assert sorted(index.overlapping(20, 20)) == ['a', 'b']
+    assert sorted(index.overlapping(0, 10)) == ['a']
+    assert sorted(index.overlapping(30, 40)) == ['c']
+    assert index.overlapping(31, 40) == []
+    assert index.overlapping(0, 9) == []
+    assert IntervalIndex().overlapping(0, 100) == []
+
+
+def test_grouped_index():
+    # Per group and overall, with dates, after upserts (which move intervals between groups) and removals
+    rng = np.random.default_rng(2)
+    first_day = np.datetime64('2025-01-01')
+    keys, starts, ends = random_intervals(rng, 300)
+    groups = rng.choice(['ana', 'bruno', 'carla'], len(keys)).tolist()
+    index = GroupedIntervalIndex(keys, first_day + starts, first_day + ends, groups)
+    intervals = {key: (start, end, group) for key, start, end, group in zip(keys, starts, ends, groups)}
+
+    moved = rng.choice(keys, 50, replace=False).tolist()
+    moved_starts = rng.integers(0, DAYS, len(moved))
+    moved_ends = moved_starts + 5
+    moved_groups = rng.choice(['ana', 'diego'], len(moved)).tolist()
+    index.upsert(moved, first_day + moved_starts, first_day + moved_ends, moved_groups)
+    intervals.update(zip(moved, zip(moved_starts, moved_ends, moved_groups)))
+
+    removed = rng.choice(keys, 50, replace=False).tolist()
+    index.remove(removed)
+    for key in removed:
+        del intervals[key]
+
+    for _ in range(QUERIES):
+        start = int(rng.integers(0, DAYS))
+        end = start + int(rng.integers(0, 30))
+        for group in [None, 'ana', 'bruno', 'carla', 'diego', 'nadie']:
+            expected = brute_force(
+                {key: (a, b) for key, (a, b, g) in intervals.items() if group is None or g == group}, start, end
+            )
+            assert sorted(index.overlapping(first_day + start, first_day + end, group)) == expected
+
+
+@pytest.mark.parametrize('start, end', [('NaT', '2025-01-10'), ('2025-01-10', 'NaT'), ('2025-01-10', '2025-01-09')])
+def test_invalid_intervals(start, end):
+    # Intervals without dates or ending before they start overlap nothing
+    index = GroupedIntervalIndex([1, 2], np.array([start, '2025-01-01'], dtype='datetime64[D]'),
+                                 np.array([end, '2025-01-31'], dtype='datetime64[D]'), ['ana', 'ana'])
+    assert index.overlapping('2024-01-01', '2026-01-01') == [2]
+    index.upsert([3], np.array([start], dtype='datetime64[D]'), np.array([end], dtype='datetime64[D]'), ['ana'])
+    assert index.overlapping('2024-01-01', '2026-01-01', 'ana') == [2]
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils.persistence import diff_rows, has_changes, save_rows
+
+COLUMNS = ['Proyecto', 'Horas', 'Inicio']
+
+
+@pytest.fixture
+def persisted():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'Proyecto': ['Alfa', 'Beta', None, 'Delta'],
+        'Horas': [10.0, np.nan, 5.0, 8.0],
+        'Inicio': pd.to_datetime(['2025-01-01', '2025-02-01', None, '2025-04-01']),
+    })
+
+
+def test_unchanged(persisted):
+    # NaN, None and NaT equal themselves: an untouched table has nothing to save
+    inserted, updated, deleted_ids = diff_rows(persisted, persisted.copy(), COLUMNS)
+    assert inserted.empty and updated.empty and deleted_ids == []
+    assert not has_changes(inserted, updated, deleted_ids)
+
+
+def test_changed(persisted):
+    edited = persisted.copy()
+    edited.loc[0, 'Horas'] = 12.0
+    edited.loc[3, 'Inicio'] = pd.Timestamp('2025-05-01')
+    inserted, updated, deleted_ids = diff_rows(persisted, edited, COLUMNS)
+    assert inserted.empty and deleted_ids == []
+    assert updated['id'].tolist() == [1, 4]
+    assert updated['Horas'].tolist() == [12.0, 8.0]
+
+
+def test_changed_from_and_to_missing(persisted):
+    # A value typed in an empty cell, and a value cleared, are changes
+    edited = persisted.copy()
+    edited.loc[1, 'Horas'] = 3.0
+    edited.loc[2, 'Inicio'] = pd.Timestamp('2025-03-01')
+    edited.loc[0, 'Proyecto'] = None
+    edited.loc[3, 'Inicio'] = pd.NaT
+    _, updated, _ = diff_rows(persisted, edited, COLUMNS)
+    assert updated['id'].tolist() == [1, 2, 3, 4]
+
+
+def test_added_and_deleted(persisted):
+    # Rows added in the editor have no id; rows missing from the editor were deleted
+    added = pd.DataFrame({'id': [None], 'Proyecto': ['Epsilon'], 'Horas': [4.0], 'Inicio': [pd.NaT]})
+    edited = pd.concat([persisted[persisted['id'] != 2], added], ignore_index=True)
+    inserted, updated, deleted_ids = diff_rows(persisted, edited, COLUMNS)
+    assert updated.empty
+    assert deleted_ids == [2]
+    assert inserted.to_dict('records') == [{'Proyecto': 'Epsilon', 'Horas': 4.0, 'Inicio': pd.NaT}]
+
+
+def test_ids_and_dtypes_from_the_editor(persisted):
+    # The editor can hand back ids as text or floats and whole hours as ints: the same values are not changes
+    edited = persisted.copy()
+    edited['id'] = edited['id'].astype(str)
+    edited['Horas'] = edited['Horas'].astype(object)
+    edited.loc[0, 'Horas'] = 10
+    inserted, updated, deleted_ids = diff_rows(persisted, edited, COLUMNS)
+    assert not has_changes(inserted, updated, deleted_ids)
+
+
+def test_save_rows(persisted):
+    # The diff applied to the table gives the edited table
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE projects (id INTEGER PRIMARY KEY, "Proyecto" TEXT, "Horas" REAL, '
+                                '"Inicio" TIMESTAMP)'))
+        save_rows(connection, 'projects', COLUMNS, persisted, persisted.iloc[:0], [])
+
+    edited = persisted.copy()
+    edited.loc[0, 'Horas'] = 12.0
+    edited.loc[2, 'Inicio'] = pd.Timestamp('2025-03-01')
+    added = pd.DataFrame({'id': [None], 'Proyecto': ['Epsilon'], 'Horas': [4.0], 'Inicio': [pd.NaT]})
+    edited = pd.concat([edited[edited['id'] != 2], added], ignore_index=True)
+    inserted, updated, deleted_ids = diff_rows(persisted, edited, COLUMNS)
+    inserted.insert(0, 'id', [5])
+    with engine.begin() as connection:
+        save_rows(connection, 'projects', COLUMNS, inserted, updated, deleted_ids)
+
+    stored = pd.read_sql('SELECT * FROM projects ORDER BY id', engine, parse_dates=['Inicio'])
+    edited.loc[edited['id'].isna(), 'id'] = 5
+    expected = edited.astype({'id': int}).sort_values('id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(stored, expected, check_dtype=False)